@@ -0,0 +1,63 @@
+"""Baseline schema: products, price_data, user_watchlists
+
+Existing databases created before migrations should be stamped with
+`alembic stamp 0001` instead of running this revision.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("asin", sa.String(20)),
+        sa.Column("title", sa.String(500)),
+        sa.Column("brand", sa.String(100)),
+        sa.Column("image_url", sa.String(1000)),
+        sa.Column("affiliate_url", sa.String(1000)),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_products_id", "products", ["id"])
+    op.create_index("ix_products_asin", "products", ["asin"], unique=True)
+
+    op.create_table(
+        "price_data",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id")),
+        sa.Column("asin", sa.String(20)),
+        sa.Column("current_price", sa.Float()),
+        sa.Column("original_price", sa.Float()),
+        sa.Column("currency", sa.String(3)),
+        sa.Column("availability", sa.String(50)),
+        sa.Column("tracked_at", sa.DateTime()),
+    )
+    op.create_index("ix_price_data_id", "price_data", ["id"])
+    op.create_index("ix_price_data_asin", "price_data", ["asin"])
+    op.create_index("ix_price_data_tracked_at", "price_data", ["tracked_at"])
+
+    op.create_table(
+        "user_watchlists",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.String(100)),
+        sa.Column("asin", sa.String(20)),
+        sa.Column("alert_price", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_watchlists_id", "user_watchlists", ["id"])
+    op.create_index("ix_user_watchlists_user_id", "user_watchlists", ["user_id"])
+    op.create_index("ix_user_watchlists_asin", "user_watchlists", ["asin"])
+
+def downgrade():
+    op.drop_table("user_watchlists")
+    op.drop_table("price_data")
+    op.drop_table("products")
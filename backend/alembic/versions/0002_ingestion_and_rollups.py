@@ -0,0 +1,44 @@
+"""Product heartbeat column and hourly/daily price rollups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def _create_rollup_table(name: str):
+    op.create_table(
+        name,
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id"), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("asin", sa.String(20)),
+        sa.Column("min_price", sa.Float()),
+        sa.Column("max_price", sa.Float()),
+        sa.Column("sum_price", sa.Float()),
+        sa.Column("sample_count", sa.Integer()),
+        sa.Column("close_price", sa.Float()),
+        sa.Column("close_original_price", sa.Float()),
+        sa.Column("close_availability", sa.String(50)),
+        sa.Column("first_seen_at", sa.DateTime()),
+        sa.Column("last_seen_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("product_id", "bucket_start"),
+    )
+
+def upgrade():
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(sa.Column("last_seen_at", sa.DateTime()))
+
+    _create_rollup_table("price_rollups_hourly")
+    _create_rollup_table("price_rollups_daily")
+
+def downgrade():
+    op.drop_table("price_rollups_daily")
+    op.drop_table("price_rollups_hourly")
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("last_seen_at")
@@ -0,0 +1,61 @@
+"""Materialized latest prices and composite price_data indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_price_data_product_id_tracked_at", "price_data", ["product_id", "tracked_at"])
+    op.create_index("ix_price_data_asin_tracked_at", "price_data", ["asin", "tracked_at"])
+
+    op.create_table(
+        "product_latest_prices",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id"), primary_key=True),
+        sa.Column("asin", sa.String(20)),
+        sa.Column("current_price", sa.Float()),
+        sa.Column("original_price", sa.Float()),
+        sa.Column("currency", sa.String(3)),
+        sa.Column("availability", sa.String(50)),
+        sa.Column("tracked_at", sa.DateTime()),
+        sa.Column("last_seen_at", sa.DateTime()),
+        sa.Column("lowest_price", sa.Float()),
+        sa.Column("lowest_price_at", sa.DateTime()),
+        sa.Column("highest_price", sa.Float()),
+        sa.Column("highest_price_at", sa.DateTime()),
+        sa.Column("avg_price_30d", sa.Float()),
+    )
+    op.create_index("ix_product_latest_prices_asin", "product_latest_prices", ["asin"], unique=True)
+
+    # Seed from existing history: the newest row per product plus its all-time range.
+    # The 30-day average is filled in by the next poll of each product.
+    op.execute("""
+        INSERT INTO product_latest_prices (
+            product_id, asin, current_price, original_price, currency, availability,
+            tracked_at, last_seen_at, lowest_price, highest_price
+        )
+        SELECT p.product_id, p.asin, p.current_price, p.original_price, p.currency, p.availability,
+               p.tracked_at, p.tracked_at, s.lowest_price, s.highest_price
+        FROM price_data p
+        JOIN (
+            SELECT product_id,
+                   MAX(id) AS latest_id,
+                   MIN(CASE WHEN current_price > 0 THEN current_price END) AS lowest_price,
+                   MAX(current_price) AS highest_price
+            FROM price_data
+            WHERE product_id IS NOT NULL
+            GROUP BY product_id
+        ) s ON p.id = s.latest_id
+    """)
+
+def downgrade():
+    op.drop_table("product_latest_prices")
+    op.drop_index("ix_price_data_asin_tracked_at", table_name="price_data")
+    op.drop_index("ix_price_data_product_id_tracked_at", table_name="price_data")
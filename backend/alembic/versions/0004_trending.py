@@ -0,0 +1,29 @@
+"""Product category and previous price for trending
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(sa.Column("category", sa.String(100)))
+        batch_op.create_index("ix_products_category", ["category"])
+
+    with op.batch_alter_table("product_latest_prices") as batch_op:
+        batch_op.add_column(sa.Column("previous_price", sa.Float()))
+
+def downgrade():
+    with op.batch_alter_table("product_latest_prices") as batch_op:
+        batch_op.drop_column("previous_price")
+
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_index("ix_products_category")
+        batch_op.drop_column("category")
@@ -0,0 +1,38 @@
+"""Watchlist alert state and alert outbox
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("user_watchlists") as batch_op:
+        batch_op.add_column(sa.Column("alert_triggered_at", sa.DateTime()))
+
+    op.create_table(
+        "alert_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("watchlist_id", sa.Integer(), sa.ForeignKey("user_watchlists.id")),
+        sa.Column("user_id", sa.String(100)),
+        sa.Column("asin", sa.String(20)),
+        sa.Column("alert_price", sa.Float()),
+        sa.Column("triggered_price", sa.Float()),
+        sa.Column("triggered_at", sa.DateTime()),
+        sa.Column("delivered_at", sa.DateTime()),
+    )
+    op.create_index("ix_alert_outbox_id", "alert_outbox", ["id"])
+    op.create_index("ix_alert_outbox_watchlist_id", "alert_outbox", ["watchlist_id"])
+    op.create_index("ix_alert_outbox_user_id", "alert_outbox", ["user_id"])
+    op.create_index("ix_alert_outbox_delivered_at", "alert_outbox", ["delivered_at"])
+
+def downgrade():
+    op.drop_table("alert_outbox")
+    with op.batch_alter_table("user_watchlists") as batch_op:
+        batch_op.drop_column("alert_triggered_at")
@@ -0,0 +1,21 @@
+"""Curation priority for the refresh scheduler
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(sa.Column("curation_priority", sa.String(10)))
+
+def downgrade():
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("curation_priority")
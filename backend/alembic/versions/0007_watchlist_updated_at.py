@@ -0,0 +1,24 @@
+"""Watchlist change timestamps for incremental alert reloads
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("user_watchlists") as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime()))
+    op.execute("UPDATE user_watchlists SET updated_at = COALESCE(alert_triggered_at, created_at, CURRENT_TIMESTAMP)")
+    op.create_index("ix_user_watchlists_updated_at", "user_watchlists", ["updated_at"])
+
+def downgrade():
+    op.drop_index("ix_user_watchlists_updated_at", table_name="user_watchlists")
+    with op.batch_alter_table("user_watchlists") as batch_op:
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,26 @@
+"""Rebuild the hourly and daily price rollups from stored history, e.g. after upgrading a database from before rollups existed
+
+    python -m app.backfill_rollups
+
+Hourly, daily and auto history, deal scores and the 30-day averages all read
+the rollups, which ingestion only fills from the moment it starts writing them.
+"""
+import argparse
+import asyncio
+from app.database import dispose_engines, session_scope
+from app.services.price_rollups import price_rollups
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replace price_rollup_hourly and price_rollup_daily with rollups of all stored observations")
+    parser.add_argument("--products-per-batch", type=int, default=100)
+    return parser.parse_args(argv)
+
+async def backfill(args):
+    try:
+        async with session_scope() as session:
+            print(await price_rollups.backfill(session, args.products_per_batch))
+    finally:
+        await dispose_engines()
+
+if __name__ == "__main__":
+    asyncio.run(backfill(parse_args()))
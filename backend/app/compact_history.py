@@ -0,0 +1,19 @@
+"""Move old price observations into the cold archive, e.g. from cron
+
+    python -m app.compact_history --after-days 180
+"""
+import argparse
+import asyncio
+from app.services.cold_archive import cold_archive
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compact price_data rows older than N days into columnar segments")
+    parser.add_argument("--after-days", type=int, default=cold_archive.after_days or None, required=not cold_archive.after_days)
+    return parser.parse_args(argv)
+
+async def compact(args):
+    cold_archive.after_days = args.after_days
+    print(await cold_archive.compact())
+
+if __name__ == "__main__":
+    asyncio.run(compact(parse_args()))
@@ -1,15 +1,126 @@
+import asyncio
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from app.services.observability import get_logger, instrument_engine
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./zobda.db")
 
-engine = create_engine(DATABASE_URL)
+# Pool sizing, ignored by SQLite which manages its own connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True
+    }
+
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+asyncpg:", 1)
+    return url
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine, or None when the async driver isn't installed
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+    instrument_engine(async_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+except ImportError as e:
+    get_logger("database").warning("async_driver_unavailable", extra={"error": str(e)})
+    async_engine = None
+    AsyncSessionLocal = None
+
+class ThreadedSession:
+    """Async facade over a sync Session that runs each call in a worker thread"""
+    
+    def __init__(self, session):
+        self.sync_session = session
+    
+    def add(self, instance):
+        self.sync_session.add(instance)
+    
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+    
+    async def execute(self, statement, *args, **kwargs):
+        return await asyncio.to_thread(self.sync_session.execute, statement, *args, **kwargs)
+    
+    async def scalar(self, statement, *args, **kwargs):
+        return await asyncio.to_thread(self.sync_session.scalar, statement, *args, **kwargs)
+    
+    async def scalars(self, statement, *args, **kwargs):
+        return await asyncio.to_thread(self.sync_session.scalars, statement, *args, **kwargs)
+    
+    async def run_sync(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, self.sync_session, *args, **kwargs)
+    
+    async def flush(self):
+        await asyncio.to_thread(self.sync_session.flush)
+    
+    async def commit(self):
+        await asyncio.to_thread(self.sync_session.commit)
+    
+    async def rollback(self):
+        await asyncio.to_thread(self.sync_session.rollback)
+    
+    async def close(self):
+        await asyncio.to_thread(self.sync_session.close)
+
+@asynccontextmanager
+async def session_scope():
+    """Open a session for one request or task and close it afterwards"""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+    
+    session = ThreadedSession(SessionLocal(expire_on_commit=False))
+    try:
+        yield session
+    finally:
+        await session.close()
+
+def dialect_insert(table):
+    """INSERT construct with ON CONFLICT support for the configured database"""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with session_scope() as session:
+        yield session
+
+async def dispose_engines():
+    """Release pooled connections on shutdown"""
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
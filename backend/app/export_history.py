@@ -0,0 +1,34 @@
+"""Export price history to a file without going through the API
+
+    python -m app.export_history --format csv --output prices.csv
+    python -m app.export_history --asins B08N5W,B07XJ8C8F7 --start 2026-01-01 --format parquet --output prices.parquet
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from app.services.history_export import EXPORT_FORMATS, HistoryExporter, naive_utc
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stream price_data for many or all ASINs to a file")
+    parser.add_argument("--asins", help="Comma-separated ASINs, default all")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Inclusive start, ISO 8601")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Exclusive end, ISO 8601")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--output", help="Output file, default stdout")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    return parser.parse_args(argv)
+
+async def export(args):
+    asins = [asin.strip() for asin in args.asins.split(",") if asin.strip()] if args.asins else None
+    exporter = HistoryExporter(args.batch_size)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in exporter.stream(args.format, asins, naive_utc(args.start), naive_utc(args.end)):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    asyncio.run(export(parse_args()))
@@ -1,14 +1,43 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.services.price_tracker import price_tracker
-from app.services.affiliate_manager import affiliate_manager
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app.database import get_async_db
+from app.models.price_data import Product
+from app.services.affiliate_manager import AffiliateManager
+from app.services.http_cache import FastJSONResponse, make_etag
+from app.services.observability import MetricsMiddleware, render_metrics, sampling_profiler
+from app.services.lifecycle import ServiceContainer
+from app.services.price_stream import sse_message
+from app.services.history_export import EXPORT_FORMATS, PARQUET_AVAILABLE, naive_utc
+from app.services.cold_archive import ASIN_PATTERN
+from app.services.downsampling import MIN_LTTB_POINTS
 from app.schemas.amazon import AmazonProduct
-from typing import List, Dict
+from app.schemas.batch import BatchHistoryRequest, BatchProductsRequest
+from app.schemas.deals import DealCriteria
+from app.schemas.scheduler import CurationRequest
+from datetime import datetime
+from typing import List, Dict, Optional
+import asyncio
 import os
 
-app = FastAPI(title="Zobda API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build and start the services on startup and release them on shutdown"""
+    services = ServiceContainer()
+    app.state.services = services
+    await services.startup()
+    yield
+    await services.shutdown()
+
+def get_services(request: Request) -> ServiceContainer:
+    """The container the lifespan built, the only way routes reach services"""
+    return request.app.state.services
+
+app = FastAPI(title="Zobda API", version="1.0.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -19,92 +48,350 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
+
 @app.get("/")
 async def root():
     return {"message": "Zobda API is running"}
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving"""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness(services: ServiceContainer = Depends(get_services)):
+    """Readiness probe: 503 until startup warm-up has finished, and again while shutting down"""
+    status = services.get_status()
+    return FastJSONResponse(status, status_code=200 if services.ready else 503)
+
+def _product_response(product: Product) -> Dict:
+    """Serialize a stored product with its materialized latest price"""
+    latest_price = product.latest_price
+    
+    return {
+        "asin": product.asin,
+        "title": product.title,
+        "brand": product.brand,
+        "image_url": product.image_url,
+        "affiliate_url": product.affiliate_url,
+        "price_info": {
+            "current_price": float(latest_price.current_price) if latest_price else 0,
+            "original_price": float(latest_price.original_price) if latest_price else 0,
+            "currency": latest_price.currency if latest_price else "USD",
+            "availability": latest_price.availability if latest_price else "Unknown"
+        },
+        "price_stats": {
+            "lowest_price": latest_price.lowest_price,
+            "highest_price": latest_price.highest_price,
+            "avg_price_30d": round(latest_price.avg_price_30d, 2) if latest_price.avg_price_30d is not None else None,
+            "last_changed_at": latest_price.tracked_at.isoformat() if latest_price.tracked_at else None,
+            "last_seen_at": latest_price.last_seen_at.isoformat() if latest_price.last_seen_at else None
+        } if latest_price else None
+    }
+
+def _amazon_product_response(asin: str, product_info: AmazonProduct, affiliate_manager: AffiliateManager) -> Dict:
+    """Serialize a product fetched live from Amazon, for ASINs not tracked yet"""
+    # Create affiliate URL
+    affiliate_url = affiliate_manager.create_affiliate_url(asin, "api", "product-detail")
+    
+    return {
+        "asin": asin,
+        "title": product_info.title,
+        "brand": product_info.brand,
+        "image_url": product_info.image_url,
+        "affiliate_url": affiliate_url,
+        "price_info": product_info.price_info.dict()
+    }
+
 @app.get("/api/products/{asin}")
-async def get_product(asin: str, db: Session = Depends(get_db)):
+async def get_product(asin: str, request: Request, db: AsyncSession = Depends(get_async_db), services: ServiceContainer = Depends(get_services)):
     """Get product information with affiliate URL"""
     try:
         # Get product from database
-        from app.models.price_data import Product, PriceData
-        product = db.query(Product).filter(Product.asin == asin).first()
+        product = await db.scalar(
+            select(Product).options(joinedload(Product.latest_price)).where(Product.asin == asin)
+        )
         
         if not product:
-            # Fetch from Amazon API
-            from app.services.amazon_api import amazon_api
-            product_info = await amazon_api.get_product_info(asin)
-            if not product_info:
-                raise HTTPException(status_code=404, detail="Product not found")
-            
-            # Create affiliate URL
-            affiliate_url = affiliate_manager.create_affiliate_url(asin, "api", "product-detail")
+            # Fetch from Amazon API through the cache so concurrent misses share one call
+            async def fetch_product():
+                product_info = await services.amazon_api.get_product_info(asin)
+                if not product_info:
+                    return None
+                return _amazon_product_response(asin, product_info, services.affiliate_manager)
             
-            return {
-                "asin": asin,
-                "title": product_info.title,
-                "brand": product_info.brand,
-                "image_url": product_info.image_url,
-                "affiliate_url": affiliate_url,
-                "price_info": product_info.price_info.dict()
-            }
+            cached = await services.product_cache.get_or_fetch(f"product:{asin}", fetch_product)
+            if not cached:
+                raise HTTPException(status_code=404, detail="Product not found")
+            return cached
         
-        # Get latest price data
-        latest_price = db.query(PriceData).filter(
-            PriceData.product_id == product.id
-        ).order_by(PriceData.tracked_at.desc()).first()
+        services.refresh_scheduler.record_view(asin)
+        
+        # Latest price is materialized at ingest, one primary-key lookup regardless of history size
+        latest_price = product.latest_price
+        etag = make_etag("product", asin, product.updated_at, latest_price.last_seen_at if latest_price else None)
+        
+        async def build():
+            return _product_response(product)
+        
+        return await services.http_cache.respond(request, etag, build)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/products/batch")
+async def get_products_batch(request: BatchProductsRequest, db: AsyncSession = Depends(get_async_db), services: ServiceContainer = Depends(get_services)):
+    """Get many products in one call, keyed by ASIN"""
+    try:
+        asins = list(dict.fromkeys(request.asins))
+        result = await db.scalars(
+            select(Product).options(joinedload(Product.latest_price)).where(Product.asin.in_(asins))
+        )
+        products = {product.asin: _product_response(product) for product in result}
+        for asin in products:
+            services.refresh_scheduler.record_view(asin)
+        
+        missing = [asin for asin in asins if asin not in products]
+        if missing:
+            # One batched upstream fetch for every ASIN not in the database
+            async def fetch_products(keys: List[str]) -> Dict[str, Dict]:
+                fetched = await services.amazon_api.get_products_info([key.split(":", 1)[1] for key in keys])
+                return {
+                    f"product:{asin}": _amazon_product_response(asin, product_info, services.affiliate_manager)
+                    for asin, product_info in fetched.items()
+                    if product_info
+                }
+            
+            cached = await services.product_cache.get_or_fetch_many([f"product:{asin}" for asin in missing], fetch_products)
+            for asin in missing:
+                if f"product:{asin}" in cached:
+                    products[asin] = cached[f"product:{asin}"]
         
         return {
-            "asin": product.asin,
-            "title": product.title,
-            "brand": product.brand,
-            "image_url": product.image_url,
-            "affiliate_url": product.affiliate_url,
-            "price_info": {
-                "current_price": float(latest_price.current_price) if latest_price else 0,
-                "original_price": float(latest_price.original_price) if latest_price else 0,
-                "currency": latest_price.currency if latest_price else "USD",
-                "availability": latest_price.availability if latest_price else "Unknown"
-            }
+            "products": products,
+            "not_found": [asin for asin in asins if asin not in products]
         }
-        
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/products/batch/history")
+async def get_price_histories_batch(request: BatchHistoryRequest, services: ServiceContainer = Depends(get_services)):
+    """Get price histories for many products in one call, keyed by ASIN"""
+    try:
+        histories = await services.price_tracker.get_price_histories(
+            list(dict.fromkeys(request.asins)), request.days, request.resolution, request.max_points
+        )
+        return {"histories": histories}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/products/{asin}/history")
-async def get_price_history(asin: str, days: int = 30):
-    """Get price history for a product"""
+async def get_price_history(
+    asin: str,
+    request: Request,
+    days: int = 30,
+    resolution: str = Query("raw", pattern="^(raw|hourly|daily|auto)$"),
+    max_points: Optional[int] = Query(None, ge=MIN_LTTB_POINTS, le=5000),
+    services: ServiceContainer = Depends(get_services)
+):
+    """Get price history for a product, optionally from rollups or downsampled"""
+    try:
+        version = await services.price_tracker.get_history_version(asin)
+        if version is None:
+            return {"asin": asin, "history": []}
+        services.refresh_scheduler.record_view(asin)
+        
+        # Repeat views between polls are answered with a 304 or the already-serialized body
+        etag = make_etag("history", asin, days, resolution, max_points, services.price_tracker.history_start(days), version)
+        
+        async def build():
+            histories = await services.price_tracker.get_price_histories([asin], days, resolution, max_points)
+            return {"asin": asin, "history": histories.get(asin, [])}
+        
+        return await services.http_cache.respond(request, etag, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/api/products/{asin}/curation")
+async def set_product_curation(asin: str, request: CurationRequest, db: AsyncSession = Depends(get_async_db)):
+    """Mark a product as admin-curated so the refresh scheduler polls it more often"""
     try:
-        history = await price_tracker.get_price_history(asin, days)
-        return {"asin": asin, "history": history}
+        product = await db.scalar(select(Product).where(Product.asin == asin))
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product.curation_priority = request.priority
+        await db.commit()
+        return {"asin": asin, "curation_priority": request.priority}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/export/price-history")
+async def export_price_history(
+    asins: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    services: ServiceContainer = Depends(get_services)
+):
+    """Stream price history for many or all ASINs (comma-separated) as NDJSON, CSV or Parquet"""
+    asin_list = [asin.strip() for asin in asins.split(",") if asin.strip()] if asins else None
+    invalid = [asin for asin in asin_list or [] if not ASIN_PATTERN.match(asin)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid ASINs: {', '.join(invalid[:10])}")
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Parquet export requires the pyarrow package")
+    
+    # Normalised up front: comparing an aware bound mid-stream would fail after the response has started
+    return StreamingResponse(
+        services.history_exporter.stream(format, asin_list, naive_utc(start), naive_utc(end)),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="price-history.{format}"'}
+    )
+
 @app.get("/api/trending")
-async def get_trending_products(limit: int = 10):
+async def get_trending_products(request: Request, limit: int = Query(10, ge=1, le=100), category: Optional[str] = None, services: ServiceContainer = Depends(get_services)):
     """Get trending products with affiliate URLs"""
     try:
-        trending = await price_tracker.get_trending_products(limit)
-        # Add affiliate URLs
-        trending_with_affiliate = affiliate_manager.create_affiliate_urls_batch(trending, "trending")
-        return {"products": trending_with_affiliate}
+        await services.trending.ensure_fresh()
+        etag = make_etag("trending", limit, category, services.trending.version, services.trending.cutoff())
+        
+        async def build():
+            trending = await services.price_tracker.get_trending_products(limit, category)
+            # Add affiliate URLs
+            trending_with_affiliate = services.affiliate_manager.create_affiliate_urls_batch(trending, "trending")
+            return {"products": trending_with_affiliate}
+        
+        return await services.http_cache.respond(request, etag, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/deals")
+async def get_deals(limit: int = Query(20, ge=1, le=200), category: Optional[str] = None, services: ServiceContainer = Depends(get_services)):
+    """Get highlighted deals ranked with the default deal criteria"""
+    return await score_deals(DealCriteria(), limit, category, services)
+
+@app.post("/api/deals")
+async def score_deals(criteria: DealCriteria, limit: int = Query(20, ge=1, le=200), category: Optional[str] = None, services: ServiceContainer = Depends(get_services)):
+    """Get highlighted deals ranked with custom deal criteria"""
+    try:
+        deals = await services.deal_scoring.top_deals(criteria, limit, category)
+        return {"deals": deals}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/track")
-async def track_products(asins: List[str]):
+async def track_products(asins: List[str], services: ServiceContainer = Depends(get_services)):
     """Track prices for multiple products"""
     try:
-        results = await price_tracker.track_product_prices(asins)
-        return {"results": results}
+        results = await services.price_tracker.track_product_prices(asins)
+        return {"results": results, "stats": services.price_tracker.last_run_stats}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/stream/prices")
+async def stream_prices(request: Request, asins: str = Query(..., description="Comma-separated ASINs"), snapshot: bool = True, services: ServiceContainer = Depends(get_services)):
+    """Server-Sent Events stream of price changes for some ASINs, replacing polling of product and history reads"""
+    asin_list = list(dict.fromkeys(asin.strip() for asin in asins.split(",") if asin.strip()))
+    if not asin_list:
+        raise HTTPException(status_code=400, detail="No ASINs given")
+    if len(asin_list) > services.price_stream.max_asins:
+        raise HTTPException(status_code=400, detail=f"At most {services.price_stream.max_asins} ASINs per stream")
+    
+    subscription = services.price_stream.subscribe(asin_list)
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many open streams", headers={"Retry-After": "30"})
+    
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + services.price_stream.max_stream_seconds
+        try:
+            yield f"retry: {services.price_stream.reconnect_ms}\n\n".encode()
+            # Subscribed before the snapshot is read, so no change can fall between the two
+            if snapshot:
+                yield sse_message("snapshot", await services.price_stream.snapshot(asin_list))
+            while True:
+                # Checked before popping, so a batch taken off the subscription is always sent
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                changes = await subscription.next_batch(min(services.price_stream.keepalive_seconds, remaining))
+                if changes is None or await request.is_disconnected():
+                    break
+                if changes:
+                    yield sse_message("prices", changes)
+                else:
+                    yield b": keepalive\n\n"
+        finally:
+            services.price_stream.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/stream/stats")
+async def get_stream_stats(services: ServiceContainer = Depends(get_services)):
+    """Get price stream subscriber and fan-out statistics"""
+    return services.price_stream.get_stats()
+
+@app.post("/api/workers/refresh")
+async def submit_refresh_job(asins: List[str], services: ServiceContainer = Depends(get_services)):
+    """Queue a price refresh on the sharded workers and return the job's progress"""
+    if not asins:
+        raise HTTPException(status_code=400, detail="No ASINs given")
+    return await services.refresh_workers.submit(asins)
+
+@app.get("/api/workers/jobs")
+async def get_refresh_jobs(limit: int = Query(20, ge=1, le=100), services: ServiceContainer = Depends(get_services)):
+    """Get the most recent refresh jobs"""
+    return {"jobs": await services.refresh_jobs.recent(limit)}
+
+@app.get("/api/workers/jobs/{job_id}")
+async def get_refresh_job(job_id: str, services: ServiceContainer = Depends(get_services)):
+    """Get one refresh job's progress, failure reasons and failed ASINs"""
+    job = await services.refresh_jobs.get(job_id, include_failed_asins=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/scheduler/stats")
+async def get_scheduler_stats(services: ServiceContainer = Depends(get_services)):
+    """Get refresh scheduler queue, interval and budget statistics"""
+    return services.refresh_scheduler.get_stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/api/profiles")
+async def get_request_profiles():
+    """Get the most recent sampled request profiles (PROFILE_EVERY_N_REQUESTS)"""
+    return {"every": sampling_profiler.every, "profiles": list(sampling_profiler.recent)}
+
+@app.get("/api/cache/stats")
+async def get_cache_stats(services: ServiceContainer = Depends(get_services)):
+    """Get product cache hit/miss statistics"""
+    return services.product_cache.get_stats()
+
+@app.get("/api/http-cache/stats")
+async def get_http_cache_stats(services: ServiceContainer = Depends(get_services)):
+    """Get conditional GET and response body cache statistics"""
+    return services.http_cache.get_stats()
+
 @app.get("/api/affiliate/stats")
-async def get_affiliate_stats():
+async def get_affiliate_stats(services: ServiceContainer = Depends(get_services)):
     """Get affiliate program statistics"""
-    return affiliate_manager.get_affiliate_stats()
+    return services.affiliate_manager.get_affiliate_stats()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, PrimaryKeyConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -12,13 +12,19 @@ class Product(Base):
     asin = Column(String(20), unique=True, index=True)
     title = Column(String(500))
     brand = Column(String(100))
+    category = Column(String(100), index=True)
     image_url = Column(String(1000))
     affiliate_url = Column(String(1000))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Heartbeat: last time a poll saw this product, even if the price didn't change
+    last_seen_at = Column(DateTime)
+    # Admin-curated products ("high", "medium" or "low") are refreshed more often
+    curation_priority = Column(String(10))
     
     # Relationships
     price_data = relationship("PriceData", back_populates="product")
+    latest_price = relationship("ProductLatestPrice", back_populates="product", uselist=False)
 
 class PriceData(Base):
     __tablename__ = "price_data"
@@ -32,9 +38,38 @@ class PriceData(Base):
     availability = Column(String(50))
     tracked_at = Column(DateTime, default=datetime.utcnow, index=True)
     
+    __table_args__ = (
+        Index("ix_price_data_product_id_tracked_at", "product_id", "tracked_at"),
+        Index("ix_price_data_asin_tracked_at", "asin", "tracked_at"),
+    )
+    
     # Relationships
     product = relationship("Product", back_populates="price_data")
 
+class ProductLatestPrice(Base):
+    """Denormalized current price and summary stats, one row per product, kept up to date at ingest"""
+    __tablename__ = "product_latest_prices"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    asin = Column(String(20), unique=True, index=True)
+    current_price = Column(Float)
+    original_price = Column(Float)
+    currency = Column(String(3), default="USD")
+    availability = Column(String(50))
+    # Price before the most recent change
+    previous_price = Column(Float)
+    # When the price last changed, and when a poll last confirmed it
+    tracked_at = Column(DateTime)
+    last_seen_at = Column(DateTime)
+    lowest_price = Column(Float)
+    lowest_price_at = Column(DateTime)
+    highest_price = Column(Float)
+    highest_price_at = Column(DateTime)
+    avg_price_30d = Column(Float)
+    
+    # Relationships
+    product = relationship("Product", back_populates="latest_price")
+
 class UserWatchlist(Base):
     __tablename__ = "user_watchlists"
     
@@ -42,7 +77,51 @@ class UserWatchlist(Base):
     user_id = Column(String(100), index=True)
     asin = Column(String(20), index=True)
     alert_price = Column(Float)
+    # Set when the alert fires, cleared once the price recovers enough to re-arm it
+    alert_triggered_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Every write moves it, so alert engines in other processes can reload only what changed
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     product = relationship("Product", foreign_keys=[asin], primaryjoin="UserWatchlist.asin == Product.asin")
+
+class AlertOutbox(Base):
+    """Triggered price alerts waiting to be delivered"""
+    __tablename__ = "alert_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    watchlist_id = Column(Integer, ForeignKey("user_watchlists.id"), index=True)
+    user_id = Column(String(100), index=True)
+    asin = Column(String(20))
+    alert_price = Column(Float)
+    triggered_price = Column(Float)
+    triggered_at = Column(DateTime, default=datetime.utcnow)
+    delivered_at = Column(DateTime, index=True)
+
+class PriceRollupMixin:
+    """Per-bucket price aggregates, updated incrementally at ingest time"""
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    asin = Column(String(20))
+    min_price = Column(Float)
+    max_price = Column(Float)
+    sum_price = Column(Float)
+    sample_count = Column(Integer)
+    close_price = Column(Float)
+    close_original_price = Column(Float)
+    close_availability = Column(String(50))
+    first_seen_at = Column(DateTime)
+    last_seen_at = Column(DateTime)
+    
+    @property
+    def avg_price(self) -> float:
+        return self.sum_price / self.sample_count if self.sample_count else 0.0
+
+class PriceRollupHourly(PriceRollupMixin, Base):
+    __tablename__ = "price_rollups_hourly"
+    __table_args__ = (PrimaryKeyConstraint("product_id", "bucket_start"),)
+
+class PriceRollupDaily(PriceRollupMixin, Base):
+    __tablename__ = "price_rollups_daily"
+    __table_args__ = (PrimaryKeyConstraint("product_id", "bucket_start"),)
@@ -12,6 +12,7 @@ class AmazonProduct(BaseModel):
     asin: str
     title: str
     brand: str
+    category: str = ""
     image_url: str
     price_info: PriceInfo
     affiliate_url: str
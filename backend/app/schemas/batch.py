@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.services.downsampling import MIN_LTTB_POINTS
+
+# Enough for a full watchlist or price-drops page in one request
+MAX_BATCH_ASINS = 300
+
+class BatchProductsRequest(BaseModel):
+    asins: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_ASINS)
+
+class BatchHistoryRequest(BaseModel):
+    asins: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_ASINS)
+    days: int = Field(30, ge=1)
+    resolution: str = Field("raw", pattern="^(raw|hourly|daily|auto)$")
+    max_points: Optional[int] = Field(None, ge=MIN_LTTB_POINTS, le=5000)
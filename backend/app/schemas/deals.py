@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from typing import Dict
+
+# Same defaults as DEFAULT_CRITERIA in src/services/dealsAlgorithm.ts
+DEFAULT_CATEGORY_WEIGHTS = {
+    "Electronics": 1.2,
+    "Appliances": 1.1,
+    "Home & Kitchen": 1.0,
+    "Health & Personal Care": 0.9,
+    "Sports & Outdoors": 0.8,
+    "Books": 0.7,
+    "Toys & Games": 0.8,
+    "Clothing": 0.9,
+    "Automotive": 0.8,
+    "Office Products": 0.7
+}
+
+class DealCriteria(BaseModel):
+    min_price_drop_percent: float = 0.2
+    max_days_from_lowest: float = 0.1
+    # The frontend declares 30 but only ever enforced a week of history
+    min_price_history_days: int = 7
+    category_weights: Dict[str, float] = Field(default_factory=lambda: dict(DEFAULT_CATEGORY_WEIGHTS))
+    freshness_hours: int = 24
+    min_deal_score: float = 30
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class CurationRequest(BaseModel):
+    # Same levels as CuratedProduct.priority in src/services/curatedTrackingService.ts; null un-curates
+    priority: Optional[str] = Field(None, pattern="^(high|medium|low)$")
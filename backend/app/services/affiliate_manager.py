@@ -1,13 +1,21 @@
+import os
+from functools import lru_cache
 from typing import Dict, List
+from urllib.parse import quote, urlencode
 from app.services.amazon_api import amazon_api
 
 class AffiliateManager:
     def __init__(self):
         self.associate_tag = amazon_api.associate_tag
+        # The URL depends only on (asin, source, campaign), so each one is built once
+        self._url_for = lru_cache(maxsize=int(os.getenv("AFFILIATE_URL_CACHE_SIZE", "100000")))(self._build_affiliate_url)
     
     def create_affiliate_url(self, asin: str, source: str = "zobda", campaign: str = "default") -> str:
         """Create affiliate URL with tracking parameters"""
-        base_url = f"https://www.amazon.com/dp/{asin}"
+        return self._url_for(asin, source, campaign)
+    
+    def _build_affiliate_url(self, asin: str, source: str, campaign: str) -> str:
+        base_url = f"https://www.amazon.com/dp/{quote(asin, safe='')}"
         
         params = {
             "tag": self.associate_tag,
@@ -19,8 +27,7 @@ class AffiliateManager:
             "creativeASIN": asin
         }
         
-        query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-        return f"{base_url}?{query_string}"
+        return f"{base_url}?{urlencode(params)}"
     
     def create_affiliate_urls_batch(self, products: List[Dict], source: str = "zobda") -> List[Dict]:
         """Create affiliate URLs for multiple products"""
@@ -44,6 +51,3 @@ class AffiliateManager:
             "cookie_duration": "24 hours",
             "tracking_enabled": True
         }
-
-# Global instance
-affiliate_manager = AffiliateManager()
@@ -0,0 +1,311 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.database import session_scope
+from app.models.price_data import AlertOutbox, UserWatchlist
+from app.services.observability import get_logger
+
+logger = get_logger("alert_engine")
+
+# Reloads re-read this far behind the watermark: transactions can commit after a later
+# updated_at is already visible, and writers' clocks drift
+RELOAD_OVERLAP = timedelta(seconds=60)
+
+class AsinAlerts:
+    """Alert thresholds for one ASIN, split into armed and already-fired alerts"""
+    
+    def __init__(self):
+        # (alert_price, watchlist_id), ascending: fires when price <= alert_price
+        self.armed: List[Tuple[float, int]] = []
+        # (-rearm_price, watchlist_id), ascending: re-arms when price > rearm_price
+        self.fired: List[Tuple[float, int]] = []
+    
+    def __len__(self):
+        return len(self.armed) + len(self.fired)
+    
+    def trigger(self, price: float) -> List[Tuple[float, int]]:
+        """Pop every armed alert at or above price"""
+        i = bisect_left(self.armed, (price, -1))
+        triggered = self.armed[i:]
+        del self.armed[i:]
+        return triggered
+    
+    def rearm(self, price: float) -> List[Tuple[float, int]]:
+        """Pop every fired alert whose re-arm price is below price"""
+        i = bisect_right(self.fired, (-price, float("inf")))
+        rearmed = self.fired[i:]
+        del self.fired[i:]
+        return rearmed
+    
+    def remove(self, entry: Tuple[float, int], fired: bool):
+        entries = self.fired if fired else self.armed
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            entries.pop(i)
+
+class AlertEngine:
+    """Evaluates watchlist price alerts against new observations via per-ASIN sorted indexes"""
+    
+    def __init__(self, rearm_percent: Optional[float] = None, reload_seconds: Optional[float] = None):
+        # Hysteresis: a fired alert re-arms only once the price rises this far above its threshold
+        self.rearm_percent = rearm_percent if rearm_percent is not None else float(os.getenv("ALERT_REARM_PERCENT", "2"))
+        # Watchlist rows written outside this process are picked up by a periodic reload of changed rows
+        self.reload_seconds = reload_seconds if reload_seconds is not None else float(os.getenv("ALERTS_RELOAD_SECONDS", "30"))
+        
+        self._by_asin: Dict[str, AsinAlerts] = {}
+        # watchlist_id -> (asin, user_id, alert_price, fired)
+        self._alerts: Dict[int, Tuple[str, str, float, bool]] = {}
+        self._loaded_at: Optional[float] = None
+        # Highest updated_at seen so far; reloads fetch rows changed since then
+        self._watermark: Optional[datetime] = None
+        self._reload_lock = asyncio.Lock()
+        
+        # Batched writes for the next flush
+        self._outbox: List[Dict] = []
+        self._rearmed_ids: List[int] = []
+    
+    def _rearm_price(self, alert_price: float) -> float:
+        return alert_price * (1 + self.rearm_percent / 100)
+    
+    def upsert_alert(self, watchlist_id: int, asin: str, user_id: str, alert_price: Optional[float], fired: bool = False):
+        """Add or replace one watchlist alert in the index"""
+        self.remove_alert(watchlist_id)
+        if alert_price is None or not asin:
+            return
+        alerts = self._by_asin.setdefault(asin, AsinAlerts())
+        if fired:
+            insort(alerts.fired, (-self._rearm_price(alert_price), watchlist_id))
+        else:
+            insort(alerts.armed, (alert_price, watchlist_id))
+        self._alerts[watchlist_id] = (asin, user_id, alert_price, fired)
+    
+    def remove_alert(self, watchlist_id: int):
+        """Drop one watchlist alert from the index"""
+        existing = self._alerts.pop(watchlist_id, None)
+        if existing is None:
+            return
+        asin, _, alert_price, fired = existing
+        alerts = self._by_asin.get(asin)
+        if alerts is None:
+            return
+        entry = (-self._rearm_price(alert_price), watchlist_id) if fired else (alert_price, watchlist_id)
+        alerts.remove(entry, fired)
+        if not len(alerts):
+            del self._by_asin[asin]
+    
+    async def rebuild(self):
+        """Load every watchlist alert from the database"""
+        async with session_scope() as session:
+            # Read the watermark first so rows written during the load are caught by the next reload
+            watermark = await session.scalar(select(func.max(UserWatchlist.updated_at)))
+            result = await session.execute(
+                select(
+                    UserWatchlist.id,
+                    UserWatchlist.asin,
+                    UserWatchlist.user_id,
+                    UserWatchlist.alert_price,
+                    UserWatchlist.alert_triggered_at
+                ).where(UserWatchlist.alert_price.isnot(None))
+            )
+            rows = result.all()
+        
+        # Append then sort once per ASIN, rather than insort per row
+        by_asin: Dict[str, AsinAlerts] = {}
+        alerts_by_id: Dict[int, Tuple[str, str, float, bool]] = {}
+        for row in rows:
+            if not row.asin:
+                continue
+            fired = row.alert_triggered_at is not None
+            alerts = by_asin.setdefault(row.asin, AsinAlerts())
+            if fired:
+                alerts.fired.append((-self._rearm_price(row.alert_price), row.id))
+            else:
+                alerts.armed.append((row.alert_price, row.id))
+            alerts_by_id[row.id] = (row.asin, row.user_id, row.alert_price, fired)
+        for alerts in by_asin.values():
+            alerts.armed.sort()
+            alerts.fired.sort()
+        
+        self._by_asin = by_asin
+        self._alerts = alerts_by_id
+        self._watermark = watermark
+        self._loaded_at = time.monotonic()
+    
+    async def reload(self):
+        """Apply watchlist rows changed since the last load, including alerts cleared or fired elsewhere"""
+        if self._watermark is None:
+            await self.rebuild()
+            return
+        async with session_scope() as session:
+            result = await session.execute(
+                select(
+                    UserWatchlist.id,
+                    UserWatchlist.asin,
+                    UserWatchlist.user_id,
+                    UserWatchlist.alert_price,
+                    UserWatchlist.alert_triggered_at,
+                    UserWatchlist.updated_at
+                ).where(UserWatchlist.updated_at >= self._watermark - RELOAD_OVERLAP)
+            )
+            rows = result.all()
+        
+        for row in rows:
+            # A cleared alert_price drops the alert
+            self.upsert_alert(row.id, row.asin, row.user_id, row.alert_price, row.alert_triggered_at is not None)
+            if row.updated_at is not None and row.updated_at > self._watermark:
+                self._watermark = row.updated_at
+        self._loaded_at = time.monotonic()
+    
+    def _reload_due(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return self.reload_seconds > 0 and time.monotonic() - self._loaded_at >= self.reload_seconds
+    
+    async def _ensure_fresh(self):
+        if not self._reload_due():
+            return
+        async with self._reload_lock:
+            if self._loaded_at is None:
+                await self.rebuild()
+            elif self._reload_due():
+                await self.reload()
+    
+    def evaluate(self, observations: List[Dict]) -> int:
+        """Queue outbox rows for alerts crossed by these observations; returns how many fired"""
+        fired_count = 0
+        for obs in observations:
+            price = obs["current_price"]
+            # Out-of-stock polls report 0, which isn't a real price
+            if not price or price <= 0:
+                continue
+            alerts = self._by_asin.get(obs["asin"])
+            if alerts is None:
+                continue
+            
+            for alert_price, watchlist_id in alerts.trigger(price):
+                asin, user_id, _, _ = self._alerts[watchlist_id]
+                insort(alerts.fired, (-self._rearm_price(alert_price), watchlist_id))
+                self._alerts[watchlist_id] = (asin, user_id, alert_price, True)
+                self._outbox.append({
+                    "watchlist_id": watchlist_id,
+                    "user_id": user_id,
+                    "asin": asin,
+                    "alert_price": alert_price,
+                    "triggered_price": price,
+                    "triggered_at": obs["tracked_at"]
+                })
+                fired_count += 1
+            
+            for _, watchlist_id in alerts.rearm(price):
+                asin, user_id, alert_price, _ = self._alerts[watchlist_id]
+                insort(alerts.armed, (alert_price, watchlist_id))
+                self._alerts[watchlist_id] = (asin, user_id, alert_price, False)
+                self._rearmed_ids.append(watchlist_id)
+        
+        return fired_count
+    
+    async def flush(self):
+        """Claim fired alerts and write their outbox rows and re-arms in one transaction"""
+        if not (self._outbox or self._rearmed_ids):
+            return
+        outbox, rearmed_ids = self._outbox, self._rearmed_ids
+        self._outbox, self._rearmed_ids = [], []
+        
+        async with session_scope() as session:
+            try:
+                now = datetime.utcnow()
+                claimed, lost_ids = [], []
+                for row in outbox:
+                    # Only the process whose update flips the row emits the alert, so engines
+                    # running in several workers never duplicate an outbox row
+                    result = await session.execute(
+                        update(UserWatchlist)
+                        .where(UserWatchlist.id == row["watchlist_id"], UserWatchlist.alert_triggered_at.is_(None))
+                        .values(alert_triggered_at=now, updated_at=now)
+                    )
+                    if result.rowcount == 1:
+                        claimed.append(row)
+                    else:
+                        lost_ids.append(row["watchlist_id"])
+                if claimed:
+                    await session.execute(insert(AlertOutbox), claimed)
+                if rearmed_ids:
+                    await session.execute(
+                        update(UserWatchlist)
+                        .where(UserWatchlist.id.in_(rearmed_ids), UserWatchlist.alert_triggered_at.isnot(None))
+                        .values(alert_triggered_at=None, updated_at=now)
+                    )
+                deleted_ids = []
+                if lost_ids:
+                    # Already fired elsewhere keeps its fired entry; rows deleted since the last load are dropped
+                    existing = set(await session.scalars(select(UserWatchlist.id).where(UserWatchlist.id.in_(lost_ids))))
+                    deleted_ids = [watchlist_id for watchlist_id in lost_ids if watchlist_id not in existing]
+                await session.commit()
+            except Exception:
+                logger.exception("price_alerts_flush_failed", extra={"alerts": len(outbox)})
+                await session.rollback()
+                # Keep them for the next flush rather than losing alerts
+                self._outbox = outbox + self._outbox
+                self._rearmed_ids = rearmed_ids + self._rearmed_ids
+                return
+        
+        for watchlist_id in deleted_ids:
+            self.remove_alert(watchlist_id)
+        if lost_ids:
+            logger.info("price_alerts_already_claimed", extra={"alerts": len(lost_ids)})
+    
+    async def process(self, observations: List[Dict]) -> int:
+        """Evaluate a batch of saved observations and flush the resulting alerts"""
+        await self._ensure_fresh()
+        fired = self.evaluate(observations)
+        await self.flush()
+        return fired
+    
+    async def fetch_pending(self, limit: int = 500) -> List[AlertOutbox]:
+        """Undelivered alerts, oldest first, for a delivery worker"""
+        async with session_scope() as session:
+            result = await session.scalars(
+                select(AlertOutbox).where(AlertOutbox.delivered_at.is_(None)).order_by(AlertOutbox.id).limit(limit)
+            )
+            return list(result)
+    
+    async def mark_delivered(self, outbox_ids: List[int]):
+        """Mark outbox rows as delivered"""
+        if not outbox_ids:
+            return
+        async with session_scope() as session:
+            await session.execute(
+                update(AlertOutbox).where(AlertOutbox.id.in_(outbox_ids)).values(delivered_at=datetime.utcnow())
+            )
+            await session.commit()
+
+# Global instance
+alert_engine = AlertEngine()
+
+@event.listens_for(Session, "after_flush")
+def _collect_watchlist_changes(session, flush_context):
+    """Remember watchlist rows written through the ORM until the transaction commits"""
+    changes = session.info.setdefault("watchlist_changes", [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, UserWatchlist):
+            changes.append(("upsert", obj.id, obj.asin, obj.user_id, obj.alert_price, obj.alert_triggered_at is not None))
+    for obj in session.deleted:
+        if isinstance(obj, UserWatchlist):
+            changes.append(("delete", obj.id))
+
+@event.listens_for(Session, "after_commit")
+def _apply_watchlist_changes(session):
+    for change in session.info.pop("watchlist_changes", []):
+        if change[0] == "delete":
+            alert_engine.remove_alert(change[1])
+        else:
+            alert_engine.upsert_alert(*change[1:])
+
+@event.listens_for(Session, "after_rollback")
+def _discard_watchlist_changes(session):
+    session.info.pop("watchlist_changes", None)
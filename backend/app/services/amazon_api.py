@@ -4,9 +4,54 @@ import hashlib
 import base64
 import json
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode
 import os
+import time
 from app.schemas.amazon import AmazonProduct, PriceInfo
+from app.services.observability import get_logger, observe_paapi_request
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, httpx's json() is the fallback
+    orjson = None
+
+logger = get_logger("amazon_api")
+
+# PA-API 5 accepts at most 10 ItemIds per GetItems request
+MAX_ITEMS_PER_REQUEST = 10
+
+# Status codes PA-API uses when we exceed our request rate
+THROTTLE_STATUS_CODES = (429, 503)
+
+# "full" for discovery and metadata refreshes, "price" for recurring price polls
+RESOURCE_PROFILES = {
+    "full": [
+        "ItemInfo.Title",
+        "ItemInfo.ByLineInfo",
+        "ItemInfo.Classifications",
+        "ItemInfo.ExternalIds",
+        "ItemInfo.Features",
+        "ItemInfo.ManufactureInfo",
+        "ItemInfo.ProductInfo",
+        "ItemInfo.TechnicalInfo",
+        "Images.Primary.Large",
+        "Images.Variants",
+        "Offers.Listings.Price",
+        "Offers.Listings.Availability",
+        "Offers.Listings.Condition",
+        "Offers.Listings.DeliveryInfo",
+        "Offers.Listings.MerchantInfo",
+        "Offers.Summaries.HighestPrice",
+        "Offers.Summaries.LowestPrice",
+        "Offers.Summaries.OfferCount"
+    ],
+    "price": [
+        "Offers.Listings.Price",
+        "Offers.Listings.Availability",
+        "Offers.Summaries.HighestPrice"
+    ]
+}
 
 class AmazonAPI:
     def __init__(self):
@@ -17,30 +62,87 @@ class AmazonAPI:
         self.host = f"webservices.amazon.{self.region}.amazon.com"
         self.associate_tag = os.getenv("AMAZON_ASSOCIATE_TAG")
         
-    def _generate_signature(self, method: str, uri: str, query_string: str, payload: str) -> str:
+        # Connection pool settings for the shared HTTP client
+        self.max_connections = int(os.getenv("AMAZON_HTTP_MAX_CONNECTIONS", "20"))
+        self.max_keepalive_connections = int(os.getenv("AMAZON_HTTP_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry = float(os.getenv("AMAZON_HTTP_KEEPALIVE_EXPIRY", "30"))
+        self.timeout = float(os.getenv("AMAZON_HTTP_TIMEOUT", "10"))
+        self.http2 = os.getenv("AMAZON_HTTP2", "false").lower() == "true"
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        # Signing keys only change once a day, keyed by (date, region, service)
+        self._signing_keys: Dict[Tuple[str, str, str], bytes] = {}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("h2_unavailable", extra={"detail": "AMAZON_HTTP2 is set but the h2 package is not installed, using HTTP/1.1"})
+                    http2 = False
+            
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+        return self._client
+    
+    async def start(self):
+        """Open the shared HTTP client when the app starts"""
+        self._get_client()
+    
+    async def aclose(self):
+        """Close the shared HTTP client when the app shuts down"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _generate_signature(self, method: str, uri: str, query_string: str, payload: str, amz_date: str) -> str:
         """Generate AWS signature for PA-API requests"""
         algorithm = "AWS4-HMAC-SHA256"
         service = "ProductAdvertisingAPI"
+        date_stamp = amz_date[:8]
         
         # Create canonical request
         canonical_uri = uri
         canonical_querystring = query_string
-        canonical_headers = f"host:{self.host}\nx-amz-date:{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}\n"
+        canonical_headers = f"host:{self.host}\nx-amz-date:{amz_date}\n"
         signed_headers = "host;x-amz-date"
         payload_hash = hashlib.sha256(payload.encode()).hexdigest()
         
         canonical_request = f"{method}\n{canonical_uri}\n{canonical_querystring}\n{canonical_headers}\n{signed_headers}\n{payload_hash}"
         
         # Create string to sign
-        credential_scope = f"{datetime.utcnow().strftime('%Y%m%d')}/{self.region}/{service}/aws4_request"
-        string_to_sign = f"{algorithm}\n{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+        credential_scope = f"{date_stamp}/{self.region}/{service}/aws4_request"
+        string_to_sign = f"{algorithm}\n{amz_date}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode()).hexdigest()}"
         
         # Calculate signature
-        signing_key = self._get_signature_key(self.secret_key, datetime.utcnow().strftime('%Y%m%d'), self.region, service)
+        signing_key = self._get_cached_signature_key(date_stamp, self.region, service)
         signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
         
         return f"{algorithm} Credential={self.access_key}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
     
+    def _get_cached_signature_key(self, date_stamp: str, region_name: str, service_name: str) -> bytes:
+        """Return the signing key for a date/region/service, deriving it once per day"""
+        cache_key = (date_stamp, region_name, service_name)
+        signing_key = self._signing_keys.get(cache_key)
+        if signing_key is None:
+            signing_key = self._get_signature_key(self.secret_key, date_stamp, region_name, service_name)
+            # Keys for previous days are never needed again
+            self._signing_keys = {
+                key: value for key, value in self._signing_keys.items() if key[0] == date_stamp
+            }
+            self._signing_keys[cache_key] = signing_key
+        return signing_key
+    
     def _get_signature_key(self, key: str, date_stamp: str, region_name: str, service_name: str) -> bytes:
         """Generate signing key for AWS signature"""
         k_date = hmac.new(f"AWS4{key}".encode(), date_stamp.encode(), hashlib.sha256).digest()
@@ -51,67 +153,147 @@ class AmazonAPI:
     
     async def get_product_info(self, asin: str) -> Optional[AmazonProduct]:
         """Get product information from Amazon PA-API"""
+        products = await self.get_products_info([asin])
+        return products.get(asin)
+    
+    async def get_products_info(self, asins: List[str]) -> Dict[str, Optional[AmazonProduct]]:
+        """Get product information for many ASINs, 10 per GetItems request"""
+        products, errors = await self.get_products_info_with_errors(asins)
+        for asin, reason in errors.items():
+            logger.warning("paapi_item_error", extra={"asin": asin, "reason": reason})
+        return products
+    
+    async def get_products_info_with_errors(self, asins: List[str]) -> Tuple[Dict[str, Optional[AmazonProduct]], Dict[str, str]]:
+        """Get product information for many ASINs along with a per-ASIN error reason"""
+        # Drop duplicates but keep the caller's order
+        unique_asins = list(dict.fromkeys(asins))
+        products: Dict[str, Optional[AmazonProduct]] = {}
+        errors: Dict[str, str] = {}
+        
+        for i in range(0, len(unique_asins), MAX_ITEMS_PER_REQUEST):
+            batch = unique_asins[i:i + MAX_ITEMS_PER_REQUEST]
+            batch_products, batch_errors = await self._get_items(batch)
+            products.update(batch_products)
+            errors.update(batch_errors)
+        
+        return products, errors
+    
+    async def _get_items(self, asins: List[str]) -> Tuple[Dict[str, Optional[AmazonProduct]], Dict[str, str]]:
+        """Send one signed GetItems request for up to 10 ASINs"""
         try:
-            url = f"https://{self.host}/paapi5/getitems"
+            status_code, data = await self.fetch_items_raw(asins)
             
-            payload = {
-                "PartnerTag": self.partner_tag,
-                "PartnerType": "Associates",
-                "Marketplace": "www.amazon.com",
-                "ItemIds": [asin],
-                "Resources": [
-                    "ItemInfo.Title",
-                    "ItemInfo.ByLineInfo",
-                    "ItemInfo.Classifications",
-                    "ItemInfo.ExternalIds",
-                    "ItemInfo.Features",
-                    "ItemInfo.ManufactureInfo",
-                    "ItemInfo.ProductInfo",
-                    "ItemInfo.TechnicalInfo",
-                    "Images.Primary.Large",
-                    "Images.Variants",
-                    "Offers.Listings.Price",
-                    "Offers.Listings.Availability",
-                    "Offers.Listings.Condition",
-                    "Offers.Listings.DeliveryInfo",
-                    "Offers.Listings.MerchantInfo",
-                    "Offers.Summaries.HighestPrice",
-                    "Offers.Summaries.LowestPrice",
-                    "Offers.Summaries.OfferCount"
-                ]
-            }
+            if status_code == 200:
+                return self.parse_items_response(data, asins)
             
-            headers = {
-                "Content-Type": "application/json; charset=UTF-8",
-                "X-Amz-Date": datetime.utcnow().strftime('%Y%m%dT%H%M%SZ'),
-                "Authorization": self._generate_signature("POST", "/paapi5/getitems", "", json.dumps(payload))
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return self._parse_product_data(data, asin)
-                else:
-                    print(f"Amazon API Error: {response.status_code} - {response.text}")
-                    return None
-                    
+            logger.error("paapi_error", extra={"status": status_code, "asins": asins, "body": data})
+            errors = {asin: f"HTTP {status_code}" for asin in asins}
+        
         except Exception as e:
-            print(f"Error fetching product info: {e}")
-            return None
+            logger.exception("paapi_request_failed", extra={"asins": asins})
+            errors = {asin: str(e) for asin in asins}
+        
+        return {asin: None for asin in asins}, errors
+    
+    async def fetch_items_raw(self, asins: List[str], profile: str = "full") -> Tuple[int, dict]:
+        """Send one signed GetItems request for a resource profile and return the status code and decoded body"""
+        url = f"https://{self.host}/paapi5/getitems"
+        
+        payload = {
+            "PartnerTag": self.partner_tag,
+            "PartnerType": "Associates",
+            "Marketplace": "www.amazon.com",
+            "ItemIds": asins,
+            "Resources": RESOURCE_PROFILES[profile]
+        }
+        
+        # Take one timestamp so X-Amz-Date always matches the signed date
+        amz_date = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        body = json.dumps(payload)
+        
+        headers = {
+            "Content-Type": "application/json; charset=UTF-8",
+            "X-Amz-Date": amz_date,
+            "Authorization": self._generate_signature("POST", "/paapi5/getitems", "", body, amz_date)
+        }
+        
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().post(url, content=body, headers=headers)
+        except Exception:
+            observe_paapi_request(profile, None, time.perf_counter() - start, False)
+            raise
+        observe_paapi_request(profile, response.status_code, time.perf_counter() - start, response.status_code in THROTTLE_STATUS_CODES)
+        
+        try:
+            data = orjson.loads(response.content) if orjson is not None else response.json()
+        except ValueError:
+            data = {"raw": response.text}
+        return response.status_code, data
+    
+    def parse_items_response(self, data: dict, asins: List[str]) -> Tuple[Dict[str, Optional[AmazonProduct]], Dict[str, str]]:
+        """Parse a successful GetItems response into products and per-ASIN errors"""
+        products: Dict[str, Optional[AmazonProduct]] = {asin: None for asin in asins}
+        products.update(self._parse_items_data(data))
+        errors = self._map_item_errors(data, asins)
+        
+        # Anything neither returned nor explicitly rejected is still a miss
+        for asin, product in products.items():
+            if product is None and asin not in errors:
+                errors[asin] = "NotReturned"
+        
+        return products, errors
+    
+    def parse_prices_response(self, data: dict, asins: List[str]) -> Tuple[Dict[str, Optional[Dict]], Dict[str, str]]:
+        """Parse a "price" profile response into plain price dicts and per-ASIN errors, skipping the Pydantic models"""
+        prices: Dict[str, Optional[Dict]] = {asin: None for asin in asins}
+        for item in data.get("ItemsResult", {}).get("Items", []):
+            asin = item.get("ASIN")
+            if asin:
+                prices[asin] = self._extract_price_fields(item)
+        errors = self._map_item_errors(data, asins)
+        
+        for asin, price in prices.items():
+            if price is None and asin not in errors:
+                errors[asin] = "NotReturned"
+        
+        return prices, errors
+    
+    def _parse_items_data(self, data: dict) -> Dict[str, AmazonProduct]:
+        """Parse every item in a GetItems response, keyed by ASIN"""
+        items = data.get("ItemsResult", {}).get("Items", [])
+        products = {}
+        for item in items:
+            asin = item.get("ASIN")
+            if not asin:
+                continue
+            product = self._parse_item(item, asin)
+            if product:
+                products[asin] = product
+        return products
+    
+    def _map_item_errors(self, data: dict, asins: List[str]) -> Dict[str, str]:
+        """Map partial errors in a GetItems response back to the ASINs they mention"""
+        errors = {}
+        for error in data.get("Errors", []):
+            code = error.get("Code", "UnknownError")
+            message = error.get("Message", "")
+            for asin in asins:
+                if asin in message:
+                    errors[asin] = code
+        return errors
     
     def _parse_product_data(self, data: dict, asin: str) -> Optional[AmazonProduct]:
         """Parse Amazon API response into our product format"""
+        return self._parse_items_data(data).get(asin)
+    
+    def _parse_item(self, item: dict, asin: str) -> Optional[AmazonProduct]:
+        """Parse a single GetItems item into our product format"""
         try:
-            if "ItemsResult" not in data or "Items" not in data["ItemsResult"]:
-                return None
-                
-            item = data["ItemsResult"]["Items"][0]
-            
             # Extract basic info
             title = item.get("ItemInfo", {}).get("Title", {}).get("DisplayValue", "")
             brand = item.get("ItemInfo", {}).get("ByLineInfo", {}).get("Brand", {}).get("DisplayValue", "")
+            category = item.get("ItemInfo", {}).get("Classifications", {}).get("ProductGroup", {}).get("DisplayValue", "")
             
             # Extract images
             primary_image = item.get("Images", {}).get("Primary", {}).get("Large", {}).get("URL", "")
@@ -126,24 +308,29 @@ class AmazonAPI:
                 asin=asin,
                 title=title,
                 brand=brand,
+                category=category,
                 image_url=primary_image,
                 price_info=price_info,
                 affiliate_url=affiliate_url,
                 last_updated=datetime.utcnow()
             )
-            
-        except Exception as e:
-            print(f"Error parsing product data: {e}")
+        
+        except Exception:
+            logger.exception("paapi_parse_failed", extra={"asin": asin})
             return None
     
     def _extract_price_info(self, item: dict) -> PriceInfo:
         """Extract price information from Amazon API response"""
+        return PriceInfo(**self._extract_price_fields(item))
+    
+    def _extract_price_fields(self, item: dict) -> Dict:
+        """Current price, original price, currency and availability of an item as a plain dict"""
         try:
             offers = item.get("Offers", {})
             listings = offers.get("Listings", [])
             
             if not listings:
-                return PriceInfo(current_price=0, original_price=0, availability="OutOfStock")
+                return {"current_price": 0.0, "original_price": 0.0, "currency": "USD", "availability": "OutOfStock"}
             
             listing = listings[0]
             price = listing.get("Price", {})
@@ -160,20 +347,20 @@ class AmazonAPI:
             
             availability = listing.get("Availability", {}).get("Message", "InStock")
             
-            return PriceInfo(
-                current_price=current_price,
-                original_price=original_price,
-                availability=availability,
-                currency="USD"
-            )
-            
-        except Exception as e:
-            print(f"Error extracting price info: {e}")
-            return PriceInfo(current_price=0, original_price=0, availability="Error")
+            return {
+                "current_price": current_price,
+                "original_price": original_price,
+                "currency": "USD",
+                "availability": availability
+            }
+        
+        except Exception:
+            logger.exception("paapi_price_parse_failed", extra={"asin": item.get("ASIN")})
+            return {"current_price": 0.0, "original_price": 0.0, "currency": "USD", "availability": "Error"}
     
     def create_affiliate_url(self, asin: str, custom_params: dict = None) -> str:
         """Create Amazon Associates affiliate URL"""
-        base_url = f"https://www.amazon.com/dp/{asin}"
+        base_url = f"https://www.amazon.com/dp/{quote(asin, safe='')}"
         
         params = {
             "tag": self.associate_tag,
@@ -185,8 +372,7 @@ class AmazonAPI:
         if custom_params:
             params.update(custom_params)
         
-        query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-        return f"{base_url}?{query_string}"
+        return f"{base_url}?{urlencode(params)}"
 
 # Global instance
 amazon_api = AmazonAPI()
@@ -0,0 +1,265 @@
+import asyncio
+import fcntl
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import delete, select
+from app.database import session_scope
+from app.models.price_data import PriceData
+from app.services.observability import get_logger
+
+logger = get_logger("cold_archive")
+
+EPOCH = datetime(1970, 1, 1)
+
+# ASINs become directory names under the archive root, so anything else is kept out of os.path.join
+ASIN_PATTERN = re.compile(r"^[A-Z0-9]{10}$")
+# Segments store epoch microseconds and carry a .us suffix; unsuffixed ones from
+# before it store whole seconds and are still read
+SEGMENT_NAME = re.compile(r"^(\d+)-(\d+)(\.us)?\.npy$")
+MICROSECONDS = 1_000_000
+
+# One record per observation: 16 bytes instead of a full price_data row
+SEGMENT_DTYPE = np.dtype([
+    ("tracked_at", "<i8"),
+    ("current_price", "<f4"),
+    ("original_price", "<f4"),
+    ("currency", "u1"),
+    ("availability", "u1")
+])
+
+def to_epoch(value: datetime) -> int:
+    """Exact microseconds since the epoch; float seconds would round them"""
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * MICROSECONDS + delta.microseconds
+
+def from_epoch(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+class ColdArchive:
+    """Per-ASIN columnar segments for old price observations, read back memory-mapped
+    
+    Layout: <root>/<asin>/<first>-<last>.us.npy, one structured array per compaction
+    run, with availability and currency dictionary-encoded in <root>/dictionary.json.
+    """
+    
+    def __init__(self, root: Optional[str] = None, after_days: Optional[int] = None, interval_seconds: Optional[float] = None, asins_per_batch: int = 200):
+        self.root = root or os.getenv("PRICE_ARCHIVE_DIR", "./data/price_archive")
+        # Observations older than this move out of price_data; 0 disables compaction
+        self.after_days = after_days if after_days is not None else int(os.getenv("PRICE_ARCHIVE_AFTER_DAYS", "0"))
+        self.interval_seconds = interval_seconds if interval_seconds is not None else float(os.getenv("PRICE_ARCHIVE_INTERVAL_SECONDS", "86400"))
+        self.asins_per_batch = asins_per_batch
+        
+        self._dictionary: Dict[str, List[str]] = {"currency": [], "availability": []}
+        self._dictionary_mtime: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+    
+    def _asin_dir(self, asin: str) -> str:
+        return os.path.join(self.root, asin)
+    
+    def _dictionary_path(self) -> str:
+        return os.path.join(self.root, "dictionary.json")
+    
+    def _load_dictionary(self):
+        """Reload the value dictionary if the compaction job has extended it"""
+        path = self._dictionary_path()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        if mtime == self._dictionary_mtime:
+            return
+        with open(path) as f:
+            self._dictionary = json.load(f)
+        self._dictionary_mtime = mtime
+    
+    def _encode(self, field: str, value: Optional[str]) -> int:
+        values = self._dictionary[field]
+        value = value or ""
+        if value not in values:
+            if len(values) >= 255:
+                raise ValueError(f"Too many distinct {field} values to archive")
+            values.append(value)
+        return values.index(value)
+    
+    def _write_atomic(self, path: str, write):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    
+    def _segments(self, asin: str) -> List[Tuple[int, int, str, int]]:
+        """(first, last, path, scale) for each segment of an ASIN, oldest first
+        
+        first and last are epoch microseconds; scale converts the segment's stored values to them.
+        """
+        if not ASIN_PATTERN.match(asin):
+            return []
+        try:
+            names = os.listdir(self._asin_dir(asin))
+        except OSError:
+            return []
+        segments = []
+        for name in names:
+            # Skips the .tmp files of an interrupted write and anything else that isn't a segment
+            match = SEGMENT_NAME.match(name)
+            if match is None:
+                continue
+            scale = 1 if match.group(3) else MICROSECONDS
+            segments.append((int(match.group(1)) * scale, int(match.group(2)) * scale, os.path.join(self._asin_dir(asin), name), scale))
+        return sorted(segments)
+    
+    def watermark(self, asin: str) -> Optional[int]:
+        """Epoch microsecond of the newest archived observation for an ASIN"""
+        segments = self._segments(asin)
+        return segments[-1][1] if segments else None
+    
+    def write_segment(self, asin: str, rows: List[Dict]) -> int:
+        """Append rows (oldest first) as a new segment, skipping any already archived"""
+        watermark = self.watermark(asin)
+        if watermark is not None:
+            rows = [row for row in rows if to_epoch(row["tracked_at"]) > watermark]
+        if not rows:
+            return 0
+        
+        records = np.empty(len(rows), dtype=SEGMENT_DTYPE)
+        records["tracked_at"] = [to_epoch(row["tracked_at"]) for row in rows]
+        records["current_price"] = [row["current_price"] or 0 for row in rows]
+        records["original_price"] = [row["original_price"] or 0 for row in rows]
+        records["currency"] = [self._encode("currency", row["currency"]) for row in rows]
+        records["availability"] = [self._encode("availability", row["availability"]) for row in rows]
+        
+        os.makedirs(self._asin_dir(asin), exist_ok=True)
+        path = os.path.join(self._asin_dir(asin), f"{records['tracked_at'][0]}-{records['tracked_at'][-1]}.us.npy")
+        # Dictionary first, so a reader never sees a code it can't decode
+        self._write_atomic(self._dictionary_path(), lambda f: f.write(json.dumps(self._dictionary).encode()))
+        self._write_atomic(path, lambda f: np.save(f, records))
+        return len(rows)
+    
+    def read(self, asin: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict]:
+        """Archived observations for an ASIN in [start, end), oldest first"""
+        segments = self._segments(asin)
+        if not segments:
+            return []
+        self._load_dictionary()
+        currencies = self._dictionary["currency"]
+        availabilities = self._dictionary["availability"]
+        start_ts = to_epoch(start) if start is not None else None
+        end_ts = to_epoch(end) if end is not None else None
+        
+        rows = []
+        for first, last, path, scale in segments:
+            if (start_ts is not None and last < start_ts) or (end_ts is not None and first >= end_ts):
+                continue
+            records = np.load(path, mmap_mode="r")
+            # Segments are time-ordered, so the range is two binary searches on the mapped column,
+            # with the bounds rounded up into the segment's own unit
+            lo = np.searchsorted(records["tracked_at"], -(-start_ts // scale), "left") if start_ts is not None else 0
+            hi = np.searchsorted(records["tracked_at"], -(-end_ts // scale), "left") if end_ts is not None else len(records)
+            for record in records[lo:hi].tolist():
+                rows.append({
+                    "asin": asin,
+                    "tracked_at": from_epoch(record[0] * scale),
+                    "current_price": round(record[1], 2),
+                    "original_price": round(record[2], 2),
+                    "currency": currencies[record[3]],
+                    "availability": availabilities[record[4]]
+                })
+        return rows
+    
+    def archived_asins(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.root) if ASIN_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name)))
+        except OSError:
+            return []
+    
+    async def compact(self, now: Optional[datetime] = None) -> Dict:
+        """Move observations older than after_days from price_data into segments"""
+        if not self.enabled:
+            return {"asins": 0, "archived": 0, "deleted": 0}
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.after_days)
+        os.makedirs(self.root, exist_ok=True)
+        
+        # One compactor at a time across workers; the others skip this run
+        lock = open(os.path.join(self.root, ".compaction.lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return {"asins": 0, "archived": 0, "deleted": 0, "skipped": True}
+        
+        stats = {"asins": 0, "archived": 0, "deleted": 0}
+        try:
+            self._load_dictionary()
+            async with session_scope() as session:
+                asins = (await session.scalars(
+                    select(PriceData.asin).where(PriceData.tracked_at < cutoff).distinct()
+                )).all()
+                # Rows of malformed ASINs stay in price_data rather than naming a path
+                asins = [asin for asin in asins if asin and ASIN_PATTERN.match(asin)]
+                
+                for i in range(0, len(asins), self.asins_per_batch):
+                    batch = asins[i:i + self.asins_per_batch]
+                    result = await session.execute(
+                        select(
+                            PriceData.asin,
+                            PriceData.tracked_at,
+                            PriceData.current_price,
+                            PriceData.original_price,
+                            PriceData.currency,
+                            PriceData.availability
+                        ).where(
+                            PriceData.asin.in_(batch),
+                            PriceData.tracked_at < cutoff
+                        ).order_by(PriceData.asin, PriceData.tracked_at)
+                    )
+                    by_asin: Dict[str, List[Dict]] = {}
+                    for row in result:
+                        by_asin.setdefault(row.asin, []).append(dict(row._mapping))
+                    
+                    # Segments are durable before the rows go; a crash in between is
+                    # repaired by the watermark check on the next run
+                    for asin, rows in by_asin.items():
+                        stats["archived"] += await asyncio.to_thread(self.write_segment, asin, rows)
+                    
+                    deleted = await session.execute(
+                        delete(PriceData).where(PriceData.asin.in_(batch), PriceData.tracked_at < cutoff)
+                    )
+                    await session.commit()
+                    stats["asins"] += len(by_asin)
+                    stats["deleted"] += deleted.rowcount
+        except Exception:
+            logger.exception("compaction_failed", extra={"cutoff": cutoff.isoformat()})
+        finally:
+            lock.close()
+        return stats
+    
+    async def run_forever(self):
+        """Compact on a fixed interval until cancelled"""
+        while True:
+            stats = await self.compact()
+            logger.info("compaction", extra=stats)
+            await asyncio.sleep(self.interval_seconds)
+    
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global instance
+cold_archive = ColdArchive()
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import func, select
+from app.database import session_scope
+from app.models.price_data import PriceRollupDaily, Product, ProductLatestPrice
+from app.schemas.deals import DealCriteria
+
+# Window for the average price, as in calculateAveragePrice()
+AVERAGE_DAYS = 90
+# A change this large counts as the "last significant price change" for freshness
+SIGNIFICANT_CHANGE = 0.05
+
+class DealScoringEngine:
+    """Server-side port of dealsAlgorithm.ts, scoring the whole catalog in one vectorized pass
+    
+    Review counts aren't stored by the backend, so the review filter and
+    popularity boost of the frontend version are not applied.
+    """
+    
+    def __init__(self, rebuild_seconds: Optional[float] = None):
+        self.rebuild_seconds = rebuild_seconds if rebuild_seconds is not None else float(os.getenv("DEALS_REBUILD_SECONDS", "300"))
+        self._built_at: Optional[float] = None
+        self._rebuild_lock = asyncio.Lock()
+        
+        # Parallel per-product arrays, index i is one product
+        self.products: List[Dict] = []
+        self.categories: List[str] = []
+        self.category_codes = np.zeros(0, dtype=np.int32)
+        self.current = np.zeros(0)
+        self.average = np.zeros(0)
+        self.lowest = np.zeros(0)
+        self.highest = np.zeros(0)
+        self.history_days = np.zeros(0, dtype=np.int32)
+        self.hours_since_change = np.zeros(0)
+    
+    async def rebuild(self):
+        """Load per-product stats from latest prices and daily rollups in one query"""
+        now = datetime.utcnow()
+        since = (now - timedelta(days=AVERAGE_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+        rollups = select(
+            PriceRollupDaily.product_id,
+            (func.sum(PriceRollupDaily.sum_price) / func.sum(PriceRollupDaily.sample_count)).label("average_price"),
+            func.count().label("history_days")
+        ).where(PriceRollupDaily.bucket_start >= since).group_by(PriceRollupDaily.product_id).subquery()
+        
+        async with session_scope() as session:
+            result = await session.execute(
+                select(
+                    Product.asin,
+                    Product.title,
+                    Product.brand,
+                    Product.category,
+                    Product.image_url,
+                    Product.affiliate_url,
+                    ProductLatestPrice.current_price,
+                    ProductLatestPrice.previous_price,
+                    ProductLatestPrice.tracked_at,
+                    ProductLatestPrice.lowest_price,
+                    ProductLatestPrice.highest_price,
+                    rollups.c.average_price,
+                    rollups.c.history_days
+                ).join(ProductLatestPrice, ProductLatestPrice.product_id == Product.id).join(
+                    rollups, rollups.c.product_id == Product.id
+                )
+            )
+            rows = result.all()
+        
+        n = len(rows)
+        products = []
+        categories: Dict[str, int] = {}
+        category_codes = np.empty(n, dtype=np.int32)
+        current = np.empty(n)
+        average = np.empty(n)
+        lowest = np.empty(n)
+        highest = np.empty(n)
+        history_days = np.empty(n, dtype=np.int32)
+        hours_since_change = np.zeros(n)
+        
+        for i, row in enumerate(rows):
+            products.append({
+                "asin": row.asin,
+                "title": row.title,
+                "brand": row.brand,
+                "category": row.category or "",
+                "image_url": row.image_url,
+                "affiliate_url": row.affiliate_url
+            })
+            category_codes[i] = categories.setdefault(row.category or "", len(categories))
+            current[i] = row.current_price or 0
+            average[i] = row.average_price or 0
+            lowest[i] = row.lowest_price or 0
+            highest[i] = row.highest_price or 0
+            history_days[i] = row.history_days or 0
+            # Only the latest change is known here; like getLastPriceChange(), no significant change means 0
+            if row.previous_price and row.tracked_at and abs((row.current_price or 0) - row.previous_price) / row.previous_price > SIGNIFICANT_CHANGE:
+                hours_since_change[i] = (now - row.tracked_at).total_seconds() / 3600
+        
+        self.products = products
+        self.categories = list(categories)
+        self.category_codes = category_codes
+        self.current = current
+        self.average = average
+        self.lowest = lowest
+        self.highest = highest
+        self.history_days = history_days
+        self.hours_since_change = hours_since_change
+        self._built_at = time.monotonic()
+    
+    async def ensure_fresh(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_seconds:
+            return
+        async with self._rebuild_lock:
+            if self._built_at is None or time.monotonic() - self._built_at >= self.rebuild_seconds:
+                await self.rebuild()
+    
+    def score(self, criteria: DealCriteria) -> Dict[str, np.ndarray]:
+        """Deal score, drop and type for every product; score is 0 where a product doesn't qualify"""
+        current, average, lowest = self.current, self.average, self.lowest
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drop_percent = np.where(average > 0, (average - current) / average, 0.0)
+            
+            # Condition 1: significant drop vs average, max 50 points
+            score = np.where(drop_percent >= criteria.min_price_drop_percent, np.minimum(drop_percent * 100, 50), 0.0)
+            
+            # Condition 2: close to the historical low, max 30 points
+            threshold = lowest * (1 + criteria.max_days_from_lowest)
+            near_lowest = current <= threshold
+            proximity = np.where(threshold > 0, (threshold - current) / threshold, 0.0)
+            score = score + np.where(near_lowest, np.minimum(proximity * 100, 30), 0.0)
+        
+        # Condition 3: category weighting
+        weights = np.array([criteria.category_weights.get(category, 1.0) for category in self.categories] or [1.0])
+        score = score * weights[self.category_codes]
+        
+        # Condition 5: freshness, decaying over 10 days
+        score = score + np.maximum(0, 10 - self.hours_since_change / 24)
+        
+        expired = current > average * (1 - criteria.min_price_drop_percent * 0.5)
+        qualifies = (
+            (self.history_days >= criteria.min_price_history_days)
+            & (current > 0)
+            & (average > 0)
+            & (score >= criteria.min_deal_score)
+            & ~expired
+        )
+        
+        return {
+            "score": np.where(qualifies, score, 0.0),
+            "qualifies": qualifies,
+            "drop_percent": drop_percent,
+            "near_lowest": near_lowest
+        }
+    
+    async def top_deals(self, criteria: DealCriteria, limit: int = 20, category: Optional[str] = None) -> List[Dict]:
+        """Highest-scoring deals, optionally within one category"""
+        await self.ensure_fresh()
+        if not self.products:
+            return []
+        
+        scored = self.score(criteria)
+        qualifies = scored["qualifies"]
+        if category is not None:
+            code = self.categories.index(category) if category in self.categories else -1
+            qualifies = qualifies & (self.category_codes == code)
+        
+        candidates = np.flatnonzero(qualifies)
+        if len(candidates) > limit:
+            # Partial selection first, only the winners get fully sorted
+            candidates = candidates[np.argpartition(-scored["score"][candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(-scored["score"][candidates], kind="stable")]
+        
+        expires_at = (datetime.utcnow() + timedelta(hours=criteria.freshness_hours)).isoformat()
+        return [
+            {
+                **self.products[i],
+                "current_price": float(self.current[i]),
+                "average_price": round(float(self.average[i]), 2),
+                "lowest_price": float(self.lowest[i]),
+                "highest_price": float(self.highest[i]),
+                "deal_score": int(round(float(scored["score"][i]))),
+                "price_drop_percent": round(float(scored["drop_percent"][i]), 2),
+                "savings_amount": round(float(self.average[i] - self.current[i]), 2),
+                "deal_type": "near_lowest" if scored["near_lowest"][i] else "price_drop",
+                "expires_at": expires_at
+            }
+            for i in candidates
+        ]
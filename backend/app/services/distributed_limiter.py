@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import date
+from typing import Optional
+from app.services.observability import get_logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional, each process then limits itself
+    aioredis = None
+
+logger = get_logger("distributed_limiter")
+
+# Refill and take one token atomically. Returns "-1" when the daily quota is used up,
+# "0" on success, otherwise the seconds to wait before trying again.
+ACQUIRE_SCRIPT = """
+local rate_max = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local per_day = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+if per_day > 0 and tonumber(redis.call('GET', KEYS[2]) or '0') >= per_day then
+    return '-1'
+end
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at', 'rate')
+local rate = tonumber(state[3]) or rate_max
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+
+if tokens < 1 then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now, 'rate', rate)
+    return tostring((1 - tokens) / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'updated_at', now, 'rate', rate)
+if per_day > 0 then
+    redis.call('INCR', KEYS[2])
+    redis.call('EXPIRE', KEYS[2], 172800)
+end
+return '0'
+"""
+
+# Shared AIMD: halve the rate on throttling (and drain the bucket), add a tenth back on success
+ADJUST_SCRIPT = """
+local rate_max = tonumber(ARGV[1])
+local throttled = ARGV[2] == '1'
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or rate_max
+
+if throttled then
+    rate = math.max(rate_max / 16, rate / 2)
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens')) or 0
+    redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', math.min(tokens, 0))
+else
+    rate = math.min(rate_max, rate + rate_max / 10)
+    redis.call('HSET', KEYS[1], 'rate', rate)
+end
+return tostring(rate)
+"""
+
+class RedisTokenBucket:
+    """Token bucket shared by every process through Redis, with the same interface as TokenBucket"""
+    
+    def __init__(self, redis_url: str, rate: float, capacity: Optional[float] = None, per_day: Optional[int] = None, key: str = "zobda:paapi"):
+        self.max_rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.per_day = per_day
+        self.key = key
+        self._redis = aioredis.from_url(redis_url)
+        self._acquire = self._redis.register_script(ACQUIRE_SCRIPT)
+        self._adjust = self._redis.register_script(ADJUST_SCRIPT)
+        # Fire-and-forget adjustments, kept so they aren't garbage collected mid-flight
+        self._pending = set()
+    
+    def _day_key(self) -> str:
+        return f"{self.key}:day:{date.today().isoformat()}"
+    
+    async def acquire(self) -> bool:
+        """Wait for one request token from the shared bucket; returns False once the daily quota is used up"""
+        while True:
+            wait = float(await self._acquire(
+                keys=[self.key, self._day_key()],
+                args=[self.max_rate, self.capacity, self.per_day or 0, time.time()]
+            ))
+            if wait < 0:
+                return False
+            if wait == 0:
+                return True
+            await asyncio.sleep(wait)
+    
+    def _adjust_later(self, throttled: bool):
+        async def adjust():
+            try:
+                await self._adjust(keys=[self.key], args=[self.max_rate, "1" if throttled else "0"])
+            except Exception as e:
+                logger.warning("shared_rate_adjust_failed", extra={"error": str(e)})
+        
+        task = asyncio.create_task(adjust())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+    
+    def on_throttled(self):
+        """Multiplicative decrease after a 429/503, seen by every worker"""
+        self._adjust_later(True)
+    
+    def on_success(self):
+        """Additive increase back towards the configured rate"""
+        self._adjust_later(False)
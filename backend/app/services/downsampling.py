@@ -0,0 +1,52 @@
+from typing import Callable, List, TypeVar
+
+T = TypeVar("T")
+
+# First, last, lowest, highest and at least one bucket pick
+MIN_LTTB_POINTS = 5
+
+def lttb(points: List[T], threshold: int, x: Callable[[T], float], y: Callable[[T], float]) -> List[T]:
+    """Largest-Triangle-Three-Buckets downsampling that always keeps the lowest and highest point"""
+    if threshold < MIN_LTTB_POINTS:
+        raise ValueError(f"LTTB threshold must be at least {MIN_LTTB_POINTS}, got {threshold}")
+    n = len(points)
+    if threshold >= n:
+        return list(points)
+    
+    xs = [x(p) for p in points]
+    ys = [y(p) for p in points]
+    
+    # Reserve room for the extremes so the result never exceeds threshold
+    buckets = threshold - 4
+    bucket_size = (n - 2) / buckets
+    
+    selected = [0]
+    a = 0
+    for i in range(buckets):
+        start = int(i * bucket_size) + 1
+        end = min(int((i + 1) * bucket_size) + 1, n - 1)
+        
+        # Average of the next bucket is the third triangle vertex
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        else:
+            count = next_end - next_start
+            avg_x = sum(xs[next_start:next_end]) / count
+            avg_y = sum(ys[next_start:next_end]) / count
+        
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    
+    # Price charts care most about the extremes
+    lowest = min(range(n), key=ys.__getitem__)
+    highest = max(range(n), key=ys.__getitem__)
+    indices = sorted(set(selected) | {lowest, highest})
+    return [points[i] for i in indices]
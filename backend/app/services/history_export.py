@@ -0,0 +1,157 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from sqlalchemy import select
+from app.database import session_scope
+from app.models.price_data import PriceData
+from app.services.cold_archive import cold_archive
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet export is optional
+    pa = None
+    pq = None
+
+PARQUET_AVAILABLE = pq is not None
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+EXPORT_COLUMNS = ["asin", "tracked_at", "current_price", "original_price", "currency", "availability"]
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Observations are stored as naive UTC, so aware bounds are converted before comparing"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+class _ChunkSink:
+    """Write-only file object that hands out whatever was written since the last drain"""
+    
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self.closed = False
+    
+    def write(self, data) -> int:
+        return self._buffer.write(data)
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer = io.BytesIO()
+        return data
+
+class HistoryExporter:
+    """Streams price_data for many ASINs with a server-side cursor, in constant memory"""
+    
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+    
+    def _query(self, asins: Optional[List[str]], start: Optional[datetime], end: Optional[datetime]):
+        query = select(
+            PriceData.id,
+            PriceData.asin,
+            PriceData.tracked_at,
+            PriceData.current_price,
+            PriceData.original_price,
+            PriceData.currency,
+            PriceData.availability
+        )
+        if asins:
+            query = query.where(PriceData.asin.in_(asins))
+        if start is not None:
+            query = query.where(PriceData.tracked_at >= start)
+        if end is not None:
+            query = query.where(PriceData.tracked_at < end)
+        return query
+    
+    async def iter_batches(self, asins: Optional[List[str]] = None, start: Optional[datetime] = None, end: Optional[datetime] = None) -> AsyncIterator[List[Dict]]:
+        """Yield lists of up to batch_size rows: archived rows by ASIN, then hot rows by ASIN then time"""
+        for asin in asins or cold_archive.archived_asins():
+            rows = await asyncio.to_thread(cold_archive.read, asin, start, end)
+            for i in range(0, len(rows), self.batch_size):
+                yield rows[i:i + self.batch_size]
+        
+        query = self._query(asins, start, end)
+        async with session_scope() as session:
+            if hasattr(session, "stream"):
+                result = await session.stream(
+                    query.order_by(PriceData.asin, PriceData.tracked_at).execution_options(yield_per=self.batch_size)
+                )
+                async for partition in result.partitions():
+                    yield [self._row(row) for row in partition]
+                return
+            
+            # The thread-pool session can't hold a cursor open, so page by primary key instead
+            last_id = 0
+            while True:
+                rows = (await session.execute(
+                    query.where(PriceData.id > last_id).order_by(PriceData.id).limit(self.batch_size)
+                )).all()
+                if not rows:
+                    return
+                last_id = rows[-1].id
+                yield [self._row(row) for row in rows]
+    
+    def _row(self, row) -> Dict:
+        return {
+            "asin": row.asin,
+            "tracked_at": row.tracked_at,
+            "current_price": row.current_price,
+            "original_price": row.original_price,
+            "currency": row.currency,
+            "availability": row.availability
+        }
+    
+    async def stream(self, fmt: str, asins: Optional[List[str]] = None, start: Optional[datetime] = None, end: Optional[datetime] = None) -> AsyncIterator[bytes]:
+        """Encode the export incrementally as NDJSON, CSV or Parquet"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format {fmt}, expected one of {list(EXPORT_FORMATS)}")
+        if fmt == "parquet" and not PARQUET_AVAILABLE:
+            raise ValueError("Parquet export requires the pyarrow package")
+        
+        batches = self.iter_batches(asins, start, end)
+        if fmt == "ndjson":
+            async for batch in batches:
+                yield "".join(
+                    json.dumps({**row, "tracked_at": row["tracked_at"].isoformat()}) + "\n"
+                    for row in batch
+                ).encode()
+        elif fmt == "csv":
+            yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+            async for batch in batches:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([[row[column] for column in EXPORT_COLUMNS] for row in batch])
+                yield buffer.getvalue().encode()
+        else:
+            schema = pa.schema([
+                ("asin", pa.string()),
+                ("tracked_at", pa.timestamp("us")),
+                ("current_price", pa.float64()),
+                ("original_price", pa.float64()),
+                ("currency", pa.string()),
+                ("availability", pa.string())
+            ])
+            sink = _ChunkSink()
+            writer = pq.ParquetWriter(sink, schema)
+            # Each batch becomes one row group, so only one batch is ever held in memory
+            async for batch in batches:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            writer.close()
+            yield sink.drain()
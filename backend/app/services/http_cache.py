@@ -0,0 +1,96 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is the fallback
+    orjson = None
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+else:
+    FastJSONResponse = JSONResponse
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes with the same encoder as FastJSONResponse"""
+    return FastJSONResponse(content).body
+
+def make_etag(*parts) -> str:
+    """Strong ETag over the values that fully determine a response body"""
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest() + '"'
+
+class HttpCache:
+    """Conditional GET and Cache-Control for read endpoints, with serialized bodies kept per ETag"""
+    
+    def __init__(self, max_age: Optional[int] = None, stale_while_revalidate: Optional[int] = None, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        # Short max-age: data changes at most once per poll, and the ETag covers the rest
+        self.max_age = max_age if max_age is not None else int(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+        self.stale_while_revalidate = stale_while_revalidate if stale_while_revalidate is not None else int(os.getenv("HTTP_CACHE_STALE_WHILE_REVALIDATE", "300"))
+        self.max_entries = max_entries or int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "2000"))
+        # Bodies range from a few bytes to long histories, so entries alone don't bound memory
+        self.max_bytes = max_bytes or int(os.getenv("HTTP_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.not_modified = 0
+        self.body_hits = 0
+        self.body_misses = 0
+    
+    def headers(self, etag: str) -> Dict[str, str]:
+        return {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={self.max_age}, stale-while-revalidate={self.stale_while_revalidate}"
+        }
+    
+    def matches(self, request: Request, etag: str) -> bool:
+        """If-None-Match check, using the weak comparison RFC 9110 prescribes for it"""
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+    
+    async def respond(self, request: Request, etag: str, build: Callable[[], Awaitable[Any]]) -> Response:
+        """304 if the client already has etag, otherwise the cached or freshly built body"""
+        if self.matches(request, etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=self.headers(etag))
+        
+        body = self._bodies.get(etag)
+        if body is not None:
+            self.body_hits += 1
+            self._bodies.move_to_end(etag)
+        else:
+            self.body_misses += 1
+            body = dumps(await build())
+            self._store(etag, body)
+        
+        return Response(content=body, media_type="application/json", headers=self.headers(etag))
+    
+    def _store(self, etag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        # Concurrent misses on one ETag each build the body; keep one copy
+        previous = self._bodies.pop(etag, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._bodies[etag] = body
+        self._bytes += len(body)
+        while len(self._bodies) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._bodies.popitem(last=False)
+            self._bytes -= len(evicted)
+    
+    def get_stats(self) -> Dict:
+        return {
+            "entries": len(self._bodies),
+            "bytes": self._bytes,
+            "not_modified": self.not_modified,
+            "body_hits": self.body_hits,
+            "body_misses": self.body_misses,
+            "orjson": orjson is not None
+        }
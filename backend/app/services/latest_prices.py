@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlalchemy import func, select
+from app.database import dialect_insert
+from app.models.price_data import PriceRollupDaily, ProductLatestPrice
+
+def price_key(row) -> Tuple:
+    """The fields whose change makes an observation worth storing"""
+    return (row["current_price"], row["original_price"], row["currency"], row["availability"])
+
+class LatestPrices:
+    """Keeps product_latest_prices in step with ingestion so product reads are O(1)"""
+    
+    async def get_many(self, session, product_ids: List[int]) -> Dict[int, Dict]:
+        """Current latest-price rows for the given products, keyed by product_id"""
+        if not product_ids:
+            return {}
+        result = await session.execute(
+            select(ProductLatestPrice.__table__).where(ProductLatestPrice.product_id.in_(product_ids))
+        )
+        return {row.product_id: dict(row._mapping) for row in result}
+    
+    async def update(self, session, observations: List[Dict], previous: Dict[int, Dict], now: datetime) -> List[Dict]:
+        """Upsert latest price, all-time low/high and 30-day average for a batch of observations"""
+        if not observations:
+            return []
+        
+        # The 30-day average reads the daily rollups, which already include this batch
+        product_ids = [obs["product_id"] for obs in observations]
+        since = (now - timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0)
+        result = await session.execute(
+            select(
+                PriceRollupDaily.product_id,
+                func.sum(PriceRollupDaily.sum_price),
+                func.sum(PriceRollupDaily.sample_count)
+            ).where(
+                PriceRollupDaily.product_id.in_(product_ids),
+                PriceRollupDaily.bucket_start >= since
+            ).group_by(PriceRollupDaily.product_id)
+        )
+        averages = {product_id: total / count for product_id, total, count in result if count}
+        
+        rows = []
+        for obs in observations:
+            prev = previous.get(obs["product_id"]) or {}
+            price = obs["current_price"]
+            changed = not prev or price_key(prev) != price_key(obs)
+            row = {
+                "product_id": obs["product_id"],
+                "asin": obs["asin"],
+                "current_price": price,
+                "original_price": obs["original_price"],
+                "currency": obs["currency"],
+                "availability": obs["availability"],
+                "previous_price": prev.get("current_price") if changed else prev.get("previous_price"),
+                "tracked_at": obs["tracked_at"] if changed else prev["tracked_at"],
+                "last_seen_at": obs["tracked_at"],
+                "lowest_price": prev.get("lowest_price"),
+                "lowest_price_at": prev.get("lowest_price_at"),
+                "highest_price": prev.get("highest_price"),
+                "highest_price_at": prev.get("highest_price_at"),
+                "avg_price_30d": averages.get(obs["product_id"], prev.get("avg_price_30d"))
+            }
+            # Out-of-stock polls report 0 and say nothing about the price range
+            if price and price > 0:
+                if row["lowest_price"] is None or price < row["lowest_price"]:
+                    row["lowest_price"], row["lowest_price_at"] = price, obs["tracked_at"]
+                if row["highest_price"] is None or price > row["highest_price"]:
+                    row["highest_price"], row["highest_price_at"] = price, obs["tracked_at"]
+            rows.append(row)
+        
+        upsert = dialect_insert(ProductLatestPrice)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[ProductLatestPrice.product_id],
+            set_={
+                column: getattr(upsert.excluded, column)
+                for column in rows[0]
+                if column != "product_id"
+            }
+        )
+        await session.execute(upsert, rows)
+        return rows
+
+# Global instance
+latest_prices = LatestPrices()
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+from sqlalchemy import text
+from app.database import DB_POOL_SIZE, dispose_engines, session_scope
+from app.services.affiliate_manager import AffiliateManager
+from app.services.amazon_api import amazon_api
+from app.services.cold_archive import cold_archive
+from app.services.deal_scoring import DealScoringEngine
+from app.services.history_export import HistoryExporter
+from app.services.http_cache import HttpCache
+from app.services.observability import get_logger, register_cache
+from app.services.price_stream import price_stream
+from app.services.price_tracker import price_tracker
+from app.services.product_cache import ProductCache
+from app.services.refresh_jobs import refresh_jobs
+from app.services.refresh_scheduler import refresh_scheduler
+from app.services.refresh_workers import refresh_workers
+from app.services.trending import trending_engine
+
+logger = get_logger("lifecycle")
+
+class ServiceContainer:
+    """Builds, validates, starts and stops the API's services in order and reports readiness
+    
+    The lifespan creates one per app and routes reach services only through it
+    (app.state.services). startup() constructs the API's caches and engines,
+    collects the ingestion services shared with workers and CLIs, and validates
+    settings before anything starts, so importing the app never raises.
+    Connections (DB pool, PA-API client, Redis) open on first use; warm-up fills
+    the pool and builds the deal scores and trending index before the readiness
+    probe lets traffic in.
+    """
+    
+    def __init__(self, warm_up: Optional[bool] = None, warm_up_timeout: Optional[float] = None, warm_up_connections: Optional[int] = None):
+        self.warm_up_enabled = warm_up if warm_up is not None else os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+        self.warm_up_timeout = warm_up_timeout if warm_up_timeout is not None else float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))
+        self.warm_up_connections = warm_up_connections or int(os.getenv("WARMUP_DB_CONNECTIONS", str(min(4, DB_POOL_SIZE))))
+        
+        self.started = False
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.warm_up_stats: Dict[str, Dict] = {}
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self._built = False
+    
+    def build(self):
+        """Construct the API's own services and collect the shared ones, then check all their settings"""
+        self.amazon_api = amazon_api
+        self.cold_archive = cold_archive
+        self.price_tracker = price_tracker
+        self.price_stream = price_stream
+        self.trending = trending_engine
+        self.refresh_scheduler = refresh_scheduler
+        self.refresh_jobs = refresh_jobs
+        self.refresh_workers = refresh_workers
+        
+        self.product_cache = ProductCache()
+        self.http_cache = HttpCache()
+        self.affiliate_manager = AffiliateManager()
+        self.deal_scoring = DealScoringEngine()
+        self.history_exporter = HistoryExporter()
+        register_cache("product", lambda: (self.product_cache.hits + self.product_cache.stale_hits, self.product_cache.misses))
+        register_cache("http", lambda: (self.http_cache.not_modified + self.http_cache.body_hits, self.http_cache.body_misses))
+        register_cache("affiliate_url", lambda: self.affiliate_manager._url_for.cache_info()[:2])
+        
+        self.validate()
+        self._built = True
+    
+    def validate(self):
+        """Raise ValueError for invalid settings, before any service has started"""
+        self.trending.validate()
+        self.refresh_workers.validate()
+    
+    async def startup(self):
+        self.started_at = time.monotonic()
+        if not self._built:
+            self.build()
+        self.cold_archive.start()
+        self.price_stream.start()
+        # With workers enabled the scheduler only decides what is due; Celery workers do the polling
+        self.refresh_scheduler.start(self.refresh_workers.refresh if self.refresh_workers.enabled else self.price_tracker.track_product_prices)
+        self.started = True
+        
+        if self.warm_up_enabled:
+            self._warm_up_task = asyncio.create_task(self._warm_up())
+        else:
+            self.ready = True
+    
+    async def shutdown(self):
+        # Fail readiness first so the load balancer stops routing here while we drain
+        self.ready = False
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+            self._warm_up_task = None
+        await self.price_stream.stop()
+        await self.refresh_scheduler.stop()
+        await self.cold_archive.stop()
+        await self.amazon_api.aclose()
+        await dispose_engines()
+        self.started = False
+    
+    async def _step(self, name: str, coro) -> bool:
+        start = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            self.warm_up_stats[name] = {"ok": False, "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+            logger.warning("warm_up_step_failed", extra={"step": name, "error": str(e)})
+            return False
+        self.warm_up_stats[name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3)}
+        return True
+    
+    async def _open_connections(self):
+        """Check out several pooled connections at once so the first requests don't pay for connecting"""
+        async def ping():
+            async with session_scope() as session:
+                await session.execute(text("SELECT 1"))
+        
+        await asyncio.gather(*(ping() for _ in range(self.warm_up_connections)))
+    
+    async def _warm_up(self):
+        # The database is required: retry until it answers. Cache warm-up failures only cost a slower first request.
+        delay = 1.0
+        while not await self._step("database", self._open_connections()):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        
+        caches = asyncio.gather(
+            self._step("deal_scoring", self.deal_scoring.ensure_fresh()),
+            self._step("trending", self.trending.ensure_fresh())
+        )
+        done, _ = await asyncio.wait([caches], timeout=self.warm_up_timeout)
+        if not done:
+            caches.cancel()
+            logger.warning("warm_up_timed_out", extra={"timeout_seconds": self.warm_up_timeout})
+        
+        self.ready = True
+        logger.info("ready", extra={"startup_seconds": round(time.monotonic() - self.started_at, 3), "warm_up": self.warm_up_stats})
+    
+    def get_status(self) -> Dict:
+        return {
+            "status": "ready" if self.ready else "starting" if self.started else "stopped",
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3) if self.started_at is not None else None,
+            "warm_up": self.warm_up_stats
+        }
@@ -0,0 +1,260 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from sqlalchemy import event
+
+# Structured logging
+
+# Attributes every LogRecord has; anything else came in through extra= and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line, or "message key=value ..." for local development"""
+    
+    def __init__(self, json_output: bool = True):
+        super().__init__()
+        self.json_output = json_output
+    
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+        
+        if self.json_output:
+            entry = {
+                "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                "level": record.levelname,
+                "logger": record.name,
+                "event": record.getMessage(),
+                **fields
+            }
+            return json.dumps(entry, default=str)
+        
+        pairs = " ".join(f"{key}={value}" for key, value in fields.items())
+        return f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()} {pairs}".rstrip()
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """Send the app's "zobda.*" loggers to stderr, as JSON unless LOG_FORMAT=text"""
+    logger = logging.getLogger("zobda")
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_output=(fmt or os.getenv("LOG_FORMAT", "json")) != "text"))
+    logger.handlers = [handler]
+    logger.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    logger.propagate = False
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"zobda.{name}")
+
+# Configured on import so services, workers and CLIs all log the same way
+configure_logging()
+logger = get_logger("observability")
+
+# Prometheus metrics
+
+PAAPI_REQUEST_SECONDS = Histogram(
+    "zobda_paapi_request_seconds", "PA-API GetItems latency",
+    ["profile", "status", "throttled"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+DB_QUERY_SECONDS = Histogram(
+    "zobda_db_query_seconds", "Database statement latency",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "zobda_http_request_seconds", "API request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+TRACKED_ASINS = Counter("zobda_tracked_asins_total", "ASINs processed by tracking runs", ["result"])
+TRACKING_RUN_SECONDS = Histogram(
+    "zobda_tracking_run_seconds", "Duration of whole tracking runs",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+TRACKING_ASINS_PER_SECOND = Gauge("zobda_tracking_asins_per_second", "Throughput of the last tracking run")
+
+# Statement types get their own label value, everything else is OTHER to keep cardinality bounded
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"}
+SLOW_QUERY_SECONDS = float(os.getenv("DB_SLOW_QUERY_MS", "250")) / 1000
+
+def observe_paapi_request(profile: str, status: Optional[int], seconds: float, throttled: bool):
+    PAAPI_REQUEST_SECONDS.labels(profile, str(status) if status is not None else "error", "true" if throttled else "false").observe(seconds)
+
+def observe_tracking_run(stats: Dict):
+    """Record a RefreshStats.to_dict() snapshot"""
+    TRACKED_ASINS.labels("saved").inc(stats["saved"])
+    TRACKED_ASINS.labels("failed").inc(stats["failed"])
+    TRACKING_RUN_SECONDS.observe(stats["elapsed_seconds"])
+    TRACKING_ASINS_PER_SECOND.set(stats["asins_per_second"])
+
+class CacheCollector:
+    """Exports hit/miss counters the caches already keep, read at scrape time instead of on every lookup"""
+    
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Tuple[int, int]]] = {}
+    
+    def register(self, name: str, hits_misses: Callable[[], Tuple[int, int]]):
+        self._sources[name] = hits_misses
+    
+    def collect(self):
+        hits = CounterMetricFamily("zobda_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("zobda_cache_misses", "Cache misses", labels=["cache"])
+        for name, hits_misses in self._sources.items():
+            try:
+                hit_count, miss_count = hits_misses()
+            except Exception as e:
+                logger.warning("cache_stats_failed", extra={"cache": name, "error": str(e)})
+                continue
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], miss_count)
+        yield hits
+        yield misses
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+def register_cache(name: str, hits_misses: Callable[[], Tuple[int, int]]):
+    cache_collector.register(name, hits_misses)
+
+def render_metrics() -> Tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+# Database timings
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    words = statement.split(None, 1)
+    operation = words[0].upper() if words else ""
+    DB_QUERY_SECONDS.labels(operation if operation in SQL_OPERATIONS else "OTHER").observe(elapsed)
+    if elapsed >= SLOW_QUERY_SECONDS:
+        logger.warning("slow_query", extra={
+            "duration_ms": round(elapsed * 1000, 1),
+            "statement": statement[:500],
+            "executemany": executemany
+        })
+
+def _handle_error(context):
+    # after_cursor_execute doesn't fire for failed statements
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine):
+    """Time every statement on a sync or async engine"""
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+
+# Sampling profiler
+
+class SamplingProfiler:
+    """cProfile one request in every N and log the functions it spent the most own time in
+    
+    cProfile follows the thread, not the task, so a sample also includes whatever
+    other requests ran on the event loop meanwhile. Only one profile runs at a time.
+    """
+    
+    def __init__(self, every: Optional[int] = None, top: Optional[int] = None, keep: int = 20):
+        self.every = every if every is not None else int(os.getenv("PROFILE_EVERY_N_REQUESTS", "0"))
+        self.top = top or int(os.getenv("PROFILE_TOP_FUNCTIONS", "25"))
+        self.recent: deque = deque(maxlen=keep)
+        self._count = 0
+        self._active = False
+    
+    def maybe_start(self) -> Optional[cProfile.Profile]:
+        if self.every <= 0 or self._active:
+            return None
+        self._count += 1
+        if self._count % self.every:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, py-spy in-process) already owns the hook
+            return None
+        self._active = True
+        return profiler
+    
+    def finish(self, profiler: cProfile.Profile, method: str, route: str, seconds: float):
+        profiler.disable()
+        self._active = False
+        
+        stats = pstats.Stats(profiler)
+        functions: List[Dict] = []
+        for (filename, line, name), (_, calls, own, cumulative, _) in sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top]:
+            functions.append({
+                "function": f"{os.path.basename(filename)}:{line}:{name}",
+                "calls": calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3)
+            })
+        
+        sample = {"method": method, "route": route, "duration_ms": round(seconds * 1000, 1), "at": time.time(), "functions": functions}
+        self.recent.append(sample)
+        logger.info("request_profile", extra=sample)
+
+# Request latency middleware
+
+def _route_template(scope) -> str:
+    """Route path template, so /api/products/{asin} is one series rather than one per ASIN"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return "unmatched"
+    templates = getattr(app.state, "route_templates", None)
+    if templates is None:
+        templates = {getattr(route, "endpoint", None): route.path for route in app.router.routes}
+        app.state.route_templates = templates
+    return templates.get(endpoint, "unmatched")
+
+class MetricsMiddleware:
+    """Per-route latency histogram and sampled profiles, as plain ASGI so streamed responses pass straight through"""
+    
+    def __init__(self, app, profiler: Optional[SamplingProfiler] = None):
+        self.app = app
+        self.profiler = profiler or sampling_profiler
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        # Event streams stay open for minutes, a profile of one would block all others
+        streaming = (b"accept", b"text/event-stream") in scope.get("headers", [])
+        profiler = None if streaming else self.profiler.maybe_start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = _route_template(scope)
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            if profiler is not None:
+                self.profiler.finish(profiler, scope["method"], route, elapsed)
+
+# Global instance
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import func, select, update
+from app.database import engine, dialect_insert
+from app.models.price_data import PriceData, PriceRollupDaily, PriceRollupHourly, Product, ProductLatestPrice
+from app.services.cold_archive import cold_archive
+
+RESOLUTIONS = {
+    "hourly": PriceRollupHourly,
+    "daily": PriceRollupDaily
+}
+
+def bucket_start(tracked_at: datetime, resolution: str) -> datetime:
+    """Truncate a timestamp to the start of its hourly or daily bucket"""
+    if resolution == "daily":
+        return tracked_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return tracked_at.replace(minute=0, second=0, microsecond=0)
+
+class PriceRollups:
+    """Hourly and daily min/max/avg/close rollups of price observations"""
+    
+    def _upsert(self, model):
+        stmt = dialect_insert(model)
+        if engine.dialect.name == "postgresql":
+            least, greatest = func.least, func.greatest
+        else:
+            # SQLite's multi-argument min()/max() are scalar functions
+            least, greatest = func.min, func.max
+        return stmt.on_conflict_do_update(
+            index_elements=[model.product_id, model.bucket_start],
+            set_={
+                "min_price": least(model.min_price, stmt.excluded.min_price),
+                "max_price": greatest(model.max_price, stmt.excluded.max_price),
+                "sum_price": model.sum_price + stmt.excluded.sum_price,
+                "sample_count": model.sample_count + stmt.excluded.sample_count,
+                "close_price": stmt.excluded.close_price,
+                "close_original_price": stmt.excluded.close_original_price,
+                "close_availability": stmt.excluded.close_availability,
+                "last_seen_at": stmt.excluded.last_seen_at
+            }
+        )
+    
+    def _aggregate(self, observations: List[Dict], resolution: str) -> List[Dict]:
+        """Fold observations into one row per (product, bucket), in time order"""
+        buckets: Dict = {}
+        for obs in sorted(observations, key=lambda o: o["tracked_at"]):
+            # Out-of-stock polls report a price of 0, which would swamp the minimum
+            if not obs["current_price"] or obs["current_price"] <= 0:
+                continue
+            key = (obs["product_id"], bucket_start(obs["tracked_at"], resolution))
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = {
+                    "product_id": obs["product_id"],
+                    "bucket_start": key[1],
+                    "asin": obs["asin"],
+                    "min_price": obs["current_price"],
+                    "max_price": obs["current_price"],
+                    "sum_price": obs["current_price"],
+                    "sample_count": 1,
+                    "close_price": obs["current_price"],
+                    "close_original_price": obs["original_price"],
+                    "close_availability": obs["availability"],
+                    "first_seen_at": obs["tracked_at"],
+                    "last_seen_at": obs["tracked_at"]
+                }
+                continue
+            row["min_price"] = min(row["min_price"], obs["current_price"])
+            row["max_price"] = max(row["max_price"], obs["current_price"])
+            row["sum_price"] += obs["current_price"]
+            row["sample_count"] += 1
+            row["close_price"] = obs["current_price"]
+            row["close_original_price"] = obs["original_price"]
+            row["close_availability"] = obs["availability"]
+            row["last_seen_at"] = obs["tracked_at"]
+        return list(buckets.values())
+    
+    async def update(self, session, observations: List[Dict]):
+        """Fold a batch of observations into both rollup tables"""
+        for resolution, model in RESOLUTIONS.items():
+            rows = self._aggregate(observations, resolution)
+            if rows:
+                await session.execute(self._upsert(model), rows)
+    
+    async def get_history(self, session, product_id: int, start_date: datetime, resolution: str) -> List[Dict]:
+        """Rollup buckets for a product since start_date, oldest first"""
+        histories = await self.get_histories(session, [product_id], start_date, resolution)
+        return histories.get(product_id, [])
+    
+    async def get_histories(self, session, product_ids: List[int], start_date: datetime, resolution: str) -> Dict[int, List[Dict]]:
+        """Rollup buckets for many products in one query, keyed by product_id"""
+        model = RESOLUTIONS[resolution]
+        result = await session.scalars(
+            select(model).where(
+                model.product_id.in_(product_ids),
+                model.bucket_start >= bucket_start(start_date, resolution)
+            ).order_by(model.product_id, model.bucket_start)
+        )
+        histories: Dict[int, List[Dict]] = {}
+        for row in result:
+            histories.setdefault(row.product_id, []).append({
+                "date": row.bucket_start.isoformat(),
+                "price": float(row.close_price),
+                "original_price": float(row.close_original_price or 0),
+                "availability": row.close_availability,
+                "min_price": float(row.min_price),
+                "max_price": float(row.max_price),
+                "avg_price": round(row.avg_price, 2),
+                "first_seen": row.first_seen_at.isoformat()
+            })
+        return histories
+    
+    async def backfill(self, session, products_per_batch: int = 100) -> Dict:
+        """Rebuild both rollup tables from raw price_data and the cold archive, e.g. after enabling rollups
+        
+        With deduplicated history only price changes are stored, so rebuilt
+        averages weight each change once rather than every poll that saw it.
+        """
+        for model in RESOLUTIONS.values():
+            await session.execute(model.__table__.delete())
+        
+        products = (await session.execute(select(Product.id, Product.asin))).all()
+        observation_count = 0
+        
+        # A few products at a time keeps memory bounded by their history, not the whole table
+        for i in range(0, len(products), products_per_batch):
+            batch = products[i:i + products_per_batch]
+            result = await session.execute(
+                select(
+                    PriceData.product_id,
+                    PriceData.asin,
+                    PriceData.current_price,
+                    PriceData.original_price,
+                    PriceData.availability,
+                    PriceData.tracked_at
+                ).where(PriceData.product_id.in_([product_id for product_id, _ in batch]))
+            )
+            observations = [dict(row._mapping) for row in result]
+            for product_id, asin in batch:
+                observations.extend({**row, "product_id": product_id} for row in cold_archive.read(asin))
+            observation_count += len(observations)
+            await self.update(session, observations)
+        
+        # The 30-day average on latest prices is read from the daily rollups at ingest; recompute it from the rebuilt ones
+        since = (datetime.utcnow() - timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0)
+        average = select(
+            func.sum(PriceRollupDaily.sum_price) / func.sum(PriceRollupDaily.sample_count)
+        ).where(
+            PriceRollupDaily.product_id == ProductLatestPrice.product_id,
+            PriceRollupDaily.bucket_start >= since
+        ).scalar_subquery()
+        await session.execute(update(ProductLatestPrice).values(avg_price_30d=average))
+        
+        await session.commit()
+        return {"products": len(products), "observations": observation_count}
+
+# Global instance
+price_rollups = PriceRollups()
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import select
+from app.database import session_scope
+from app.models.price_data import ProductLatestPrice
+from app.services.http_cache import dumps
+from app.services.observability import get_logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional, changes then only reach subscribers of this process
+    aioredis = None
+
+logger = get_logger("price_stream")
+
+CHANNEL = "zobda:price_changes"
+
+def price_event(row: Dict) -> Dict:
+    """Public shape of a price change, from a latest-price row"""
+    tracked_at = row["tracked_at"]
+    return {
+        "asin": row["asin"],
+        "current_price": row["current_price"],
+        "previous_price": row["previous_price"],
+        "original_price": row["original_price"],
+        "currency": row["currency"],
+        "availability": row["availability"],
+        "tracked_at": tracked_at.isoformat() if hasattr(tracked_at, "isoformat") else tracked_at
+    }
+
+def sse_message(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+class Subscription:
+    """One client's ASINs and its undelivered changes, coalesced to the newest per ASIN
+    
+    Pending changes are bounded by the number of subscribed ASINs, so a slow
+    client costs a fixed amount of memory and skips straight to current prices
+    instead of replaying every intermediate one.
+    """
+    
+    def __init__(self, asins: Iterable[str]):
+        self.asins = frozenset(asins)
+        self.closed = False
+        self.delivered = 0
+        self.coalesced = 0
+        self._pending: Dict[str, Dict] = {}
+        self._wakeup = asyncio.Event()
+    
+    def push(self, change: Dict):
+        if change["asin"] in self._pending:
+            self.coalesced += 1
+        self._pending[change["asin"]] = change
+        self._wakeup.set()
+    
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+    
+    async def next_batch(self, timeout: float) -> Optional[List[Dict]]:
+        """Changes since the last call, [] after timeout with nothing new, None once closed"""
+        if not self._pending and not self.closed:
+            waiter = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait([waiter], timeout=timeout)
+            finally:
+                waiter.cancel()
+        if self.closed:
+            return None
+        self._wakeup.clear()
+        batch = list(self._pending.values())
+        self._pending = {}
+        self.delivered += len(batch)
+        return batch
+
+class PriceStreamHub:
+    """Fans price changes out to streaming clients, optionally across processes through Redis pub/sub"""
+    
+    def __init__(self, redis_url: Optional[str] = None, max_asins: Optional[int] = None, max_subscribers: Optional[int] = None, keepalive_seconds: Optional[float] = None):
+        self.max_asins = max_asins or int(os.getenv("PRICE_STREAM_MAX_ASINS", "500"))
+        self.max_subscribers = max_subscribers or int(os.getenv("PRICE_STREAM_MAX_SUBSCRIBERS", "10000"))
+        # Comment lines this often keep proxies from closing idle streams
+        self.keepalive_seconds = keepalive_seconds if keepalive_seconds is not None else float(os.getenv("PRICE_STREAM_KEEPALIVE_SECONDS", "15"))
+        # Streams end after this long and EventSource reconnects, which bounds how long a shutdown
+        # waits on open streams (uvicorn drains connections before lifespan shutdown) and rebalances clients
+        self.max_stream_seconds = float(os.getenv("PRICE_STREAM_MAX_SECONDS", "300"))
+        self.reconnect_ms = int(os.getenv("PRICE_STREAM_RECONNECT_MS", "2000"))
+        
+        redis_url = redis_url if redis_url is not None else os.getenv("PRICE_STREAM_REDIS_URL")
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("redis_unavailable", extra={"detail": "PRICE_STREAM_REDIS_URL is set but the redis package is not installed, streaming within this process only"})
+            else:
+                self._redis = aioredis.from_url(redis_url)
+        # Tags our own messages so the bridge doesn't deliver them twice
+        self._origin = uuid.uuid4().hex
+        
+        self._subscribers: Set[Subscription] = set()
+        self._by_asin: Dict[str, Set[Subscription]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.published = 0
+        self.fanned_out = 0
+    
+    def subscribe(self, asins: List[str]) -> Optional[Subscription]:
+        """Register a client for some ASINs, or None when the hub is at capacity"""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        subscription = Subscription(asins)
+        self._subscribers.add(subscription)
+        for asin in subscription.asins:
+            self._by_asin.setdefault(asin, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        for asin in subscription.asins:
+            subscribers = self._by_asin.get(asin)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_asin[asin]
+    
+    def _fan_out(self, changes: List[Dict]):
+        for change in changes:
+            for subscription in self._by_asin.get(change["asin"], ()):
+                subscription.push(change)
+                self.fanned_out += 1
+    
+    async def publish_changes(self, latest_rows: List[Dict]):
+        """Publish the rows of a saved batch whose price or availability actually changed"""
+        # latest_prices only moves tracked_at when the row changed, same test as the scheduler's
+        changes = [price_event(row) for row in latest_rows if row["tracked_at"] == row["last_seen_at"]]
+        if not changes:
+            return
+        self.published += len(changes)
+        self._fan_out(changes)
+        
+        if self._redis is not None:
+            try:
+                await self._redis.publish(CHANNEL, dumps({"origin": self._origin, "changes": changes}))
+            except Exception as e:
+                logger.warning("price_stream_publish_failed", extra={"error": str(e)})
+    
+    async def _listen(self):
+        """Deliver changes published by other API processes and refresh workers"""
+        delay = 1.0
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") != self._origin:
+                        self._fan_out(payload["changes"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("price_stream_bridge_failed", extra={"error": str(e), "retry_seconds": delay})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                await pubsub.close()
+    
+    async def snapshot(self, asins: List[str]) -> List[Dict]:
+        """Current prices, sent first so clients don't need a separate read before listening"""
+        async with session_scope() as session:
+            result = await session.execute(
+                select(ProductLatestPrice.__table__).where(ProductLatestPrice.asin.in_(asins))
+            )
+            return [price_event(row._mapping) for row in result]
+    
+    def start(self):
+        if self._redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        # Ends open streams when the server runs lifespan shutdown before draining connections
+        for subscription in list(self._subscribers):
+            subscription.close()
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+    
+    def get_stats(self) -> Dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "asins": len(self._by_asin),
+            "published": self.published,
+            "fanned_out": self.fanned_out,
+            "coalesced": sum(subscription.coalesced for subscription in self._subscribers),
+            "redis_bridge": self._redis is not None
+        }
+
+# Global instance
+price_stream = PriceStreamHub()
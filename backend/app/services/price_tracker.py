@@ -1,126 +1,361 @@
 import asyncio
+import os
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, Union
 from app.services.amazon_api import amazon_api
-from app.models.price_data import PriceData, Product
-from app.database import get_db
-from sqlalchemy.orm import Session
+from app.services.refresh_pipeline import RefreshPipeline
+from app.services.price_rollups import RESOLUTIONS, price_rollups
+from app.services.latest_prices import latest_prices, price_key
+from app.services.downsampling import lttb
+from app.services.trending import trending_engine
+from app.services.alert_engine import alert_engine
+from app.services.cold_archive import cold_archive
+from app.services.refresh_scheduler import refresh_scheduler
+from app.services.observability import get_logger, observe_tracking_run
+from app.services.price_stream import price_stream
+from app.models.price_data import PriceData, Product, ProductLatestPrice
+from app.database import session_scope, dialect_insert
+from app.schemas.amazon import AmazonProduct
+from sqlalchemy import and_, func, insert, select, update
+
+logger = get_logger("price_tracker")
 
 class PriceTracker:
     def __init__(self):
-        self.db = next(get_db())
+        # One pipeline per tracker so the rate limiter state spans runs
+        self.pipeline = RefreshPipeline(amazon_api, self.save_price_batch)
+        # Only store a new PriceData row when price or availability actually changed
+        self.dedup_prices = os.getenv("TRACKER_DEDUP_PRICES", "true").lower() == "true"
+        # Known products are polled with the lean "price" profile; title, brand and images are refreshed this often
+        self.metadata_refresh = timedelta(hours=float(os.getenv("TRACKER_METADATA_REFRESH_HOURS", "168")))
+        self.last_run_stats: Optional[Dict] = None
     
     async def track_product_prices(self, asins: List[str]) -> Dict[str, bool]:
         """Track prices for multiple products"""
-        results = {}
-        
-        for asin in asins:
-            try:
-                # Get current product info from Amazon
-                product_info = await amazon_api.get_product_info(asin)
-                
-                if product_info:
-                    # Save price data
-                    await self._save_price_data(asin, product_info)
-                    results[asin] = True
-                else:
-                    results[asin] = False
-                    
-            except Exception as e:
-                print(f"Error tracking product {asin}: {e}")
-                results[asin] = False
-        
+        profiles = await self._pick_profiles(asins)
+        results, stats = await self.pipeline.run(asins, profiles)
+        self.last_run_stats = stats.to_dict()
+        observe_tracking_run(self.last_run_stats)
+        logger.info("tracking_run", extra=self.last_run_stats)
         return results
     
-    async def _save_price_data(self, asin: str, product_info):
+    async def _pick_profiles(self, asins: List[str]) -> Dict[str, str]:
+        """"price" for products whose metadata is fresh, "full" for new ones and metadata refreshes"""
+        stale_before = datetime.utcnow() - self.metadata_refresh
+        profiles = {}
+        async with session_scope() as session:
+            for i in range(0, len(asins), 1000):
+                result = await session.execute(
+                    select(Product.asin, Product.updated_at).where(Product.asin.in_(asins[i:i + 1000]))
+                )
+                for asin, updated_at in result:
+                    if updated_at is not None and updated_at >= stale_before:
+                        profiles[asin] = "price"
+        return profiles
+    
+    def _price_fields(self, item) -> Dict:
+        """Price fields of a full AmazonProduct or a lean price-profile dict"""
+        if isinstance(item, AmazonProduct):
+            return item.price_info.dict()
+        return item
+    
+    async def _save_price_data(self, asin: str, product_info) -> bool:
         """Save price data to database"""
-        try:
-            # Check if product exists
-            product = self.db.query(Product).filter(Product.asin == asin).first()
-            
-            if not product:
-                # Create new product
-                product = Product(
-                    asin=asin,
-                    title=product_info.title,
-                    brand=product_info.brand,
-                    image_url=product_info.image_url,
-                    affiliate_url=product_info.affiliate_url,
-                    created_at=datetime.utcnow()
+        saved = await self.save_price_batch([(asin, product_info)])
+        return saved.get(asin, False)
+    
+    async def save_price_batch(self, items: List[Tuple[str, Union[AmazonProduct, Dict]]]) -> Dict[str, bool]:
+        """Upsert products and insert price observations for a whole batch at once
+        
+        Items are full AmazonProducts, or price dicts from the "price" profile for
+        products already stored, whose metadata is then left as it is.
+        """
+        if not items:
+            return {}
+        
+        # Last observation wins for duplicate ASINs; sorted so concurrent upserts lock in the same order
+        by_asin = dict(items)
+        asins = sorted(by_asin)
+        full_asins = [asin for asin in asins if isinstance(by_asin[asin], AmazonProduct)]
+        price_only_asins = [asin for asin in asins if not isinstance(by_asin[asin], AmazonProduct)]
+        now = datetime.utcnow()
+        
+        async with session_scope() as session:
+            try:
+                # One multi-row upsert for fully fetched products, refreshing metadata and the heartbeat
+                upsert = dialect_insert(Product)
+                upsert = upsert.on_conflict_do_update(
+                    index_elements=[Product.asin],
+                    set_={
+                        "title": upsert.excluded.title,
+                        "brand": upsert.excluded.brand,
+                        "category": upsert.excluded.category,
+                        "image_url": upsert.excluded.image_url,
+                        "affiliate_url": upsert.excluded.affiliate_url,
+                        "updated_at": upsert.excluded.updated_at,
+                        "last_seen_at": upsert.excluded.last_seen_at
+                    }
                 )
-                self.db.add(product)
-                self.db.commit()
-            
-            # Save price data
-            price_data = PriceData(
-                product_id=product.id,
-                asin=asin,
-                current_price=product_info.price_info.current_price,
-                original_price=product_info.price_info.original_price,
-                currency=product_info.price_info.currency,
-                availability=product_info.price_info.availability,
-                tracked_at=datetime.utcnow()
-            )
-            
-            self.db.add(price_data)
-            self.db.commit()
+                if full_asins:
+                    await session.execute(upsert, [
+                        {
+                            "asin": asin,
+                            "title": by_asin[asin].title,
+                            "brand": by_asin[asin].brand,
+                            "category": by_asin[asin].category,
+                            "image_url": by_asin[asin].image_url,
+                            "affiliate_url": by_asin[asin].affiliate_url,
+                            "created_at": now,
+                            "updated_at": now,
+                            "last_seen_at": now
+                        }
+                        for asin in full_asins
+                    ])
+                if price_only_asins:
+                    # Price polls only move the heartbeat; updated_at keeps marking the last metadata refresh
+                    await session.execute(
+                        update(Product).where(Product.asin.in_(price_only_asins)).values(last_seen_at=now, updated_at=Product.updated_at)
+                    )
+                
+                result = await session.execute(
+                    select(
+                        Product.asin,
+                        Product.id,
+                        Product.title,
+                        Product.brand,
+                        Product.category,
+                        Product.image_url,
+                        Product.affiliate_url
+                    ).where(Product.asin.in_(asins))
+                )
+                products = {row.asin: dict(row._mapping) for row in result}
+                product_ids = {asin: product["id"] for asin, product in products.items()}
+                
+                latest = await latest_prices.get_many(session, list(product_ids.values()))
+                
+                observations = []
+                rows = []
+                missing = set()
+                for asin in asins:
+                    # A price poll for a product with no row yet has nothing to attach to
+                    product_id = product_ids.get(asin)
+                    if product_id is None:
+                        missing.add(asin)
+                        continue
+                    price_info = self._price_fields(by_asin[asin])
+                    row = {
+                        "product_id": product_id,
+                        "asin": asin,
+                        "current_price": price_info["current_price"],
+                        "original_price": price_info["original_price"],
+                        "currency": price_info["currency"],
+                        "availability": price_info["availability"],
+                        "tracked_at": now
+                    }
+                    observations.append(row)
+                    # In dedup mode only real changes become new rows; last_seen_at covers the rest
+                    previous = latest.get(row["product_id"])
+                    if self.dedup_prices and previous and price_key(previous) == price_key(row):
+                        continue
+                    rows.append(row)
+                
+                # Rollups see every observation, deduplicated or not
+                await price_rollups.update(session, observations)
+                latest_rows = await latest_prices.update(session, observations, latest, now)
+                
+                if rows:
+                    # executemany, batched by SQLAlchemy into multi-row INSERTs
+                    await session.execute(insert(PriceData), rows)
+                
+                await session.commit()
             
-        except Exception as e:
-            print(f"Error saving price data for {asin}: {e}")
-            self.db.rollback()
+            except Exception:
+                logger.exception("save_prices_failed", extra={"asins": asins})
+                await session.rollback()
+                return {asin: False for asin in asins}
+        
+        if missing:
+            logger.warning("price_only_products_missing", extra={"asins": sorted(missing)})
+        
+        # Post-commit stages; a failure here doesn't undo the saved prices
+        try:
+            trending_engine.observe(latest_rows, products)
+        except Exception:
+            logger.exception("trending_observe_failed", extra={"asins": asins})
+        try:
+            refresh_scheduler.observe(latest_rows)
+        except Exception:
+            logger.exception("scheduler_observe_failed", extra={"asins": asins})
+        try:
+            await price_stream.publish_changes(latest_rows)
+        except Exception:
+            logger.exception("price_stream_failed", extra={"asins": asins})
+        try:
+            await alert_engine.process(observations)
+        except Exception:
+            logger.exception("price_alerts_failed", extra={"asins": asins})
+        
+        return {asin: asin not in missing for asin in asins}
     
-    async def get_price_history(self, asin: str, days: int = 30) -> List[Dict]:
-        """Get price history for a product"""
+    async def get_price_history(self, asin: str, days: int = 30, resolution: str = "raw", max_points: Optional[int] = None) -> List[Dict]:
+        """Get price history for a product from raw rows or hourly/daily rollups, downsampled to max_points"""
         try:
-            product = self.db.query(Product).filter(Product.asin == asin).first()
-            if not product:
-                return []
-            
-            start_date = datetime.utcnow() - timedelta(days=days)
-            price_data = self.db.query(PriceData).filter(
-                PriceData.product_id == product.id,
-                PriceData.tracked_at >= start_date
-            ).order_by(PriceData.tracked_at).all()
+            histories = await self.get_price_histories([asin], days, resolution, max_points)
+            return histories.get(asin, [])
+        except Exception:
+            logger.exception("price_history_failed", extra={"asin": asin})
+            return []
+    
+    async def get_price_histories(self, asins: List[str], days: int = 30, resolution: str = "raw", max_points: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Price histories for many products with one product lookup and one history query, keyed by ASIN"""
+        if resolution == "auto":
+            resolution = self._pick_resolution(days, max_points)
+        
+        async with session_scope() as session:
+            result = await session.execute(select(Product.id, Product.asin).where(Product.asin.in_(asins)))
+            asin_by_id = dict(result.all())
+            if not asin_by_id:
+                return {}
             
-            return [
-                {
-                    "date": data.tracked_at.isoformat(),
-                    "price": float(data.current_price),
-                    "original_price": float(data.original_price),
-                    "availability": data.availability
-                }
-                for data in price_data
-            ]
+            start_date = self.history_start(days)
             
-        except Exception as e:
-            print(f"Error getting price history for {asin}: {e}")
-            return []
+            if resolution in RESOLUTIONS:
+                by_product = await price_rollups.get_histories(session, list(asin_by_id), start_date, resolution)
+            else:
+                # Ordered by the (product_id, tracked_at) index, so each product's rows arrive contiguous
+                result = await session.execute(
+                    select(
+                        PriceData.product_id,
+                        PriceData.tracked_at,
+                        PriceData.current_price,
+                        PriceData.original_price,
+                        PriceData.availability
+                    ).where(
+                        PriceData.product_id.in_(list(asin_by_id)),
+                        PriceData.tracked_at >= start_date
+                    ).order_by(PriceData.product_id, PriceData.tracked_at)
+                )
+                # Compaction moves the oldest rows out, so archived rows always precede hot ones
+                cold = await asyncio.to_thread(self._read_cold, list(asin_by_id.values()), start_date)
+                by_product = {}
+                for product_id, asin in asin_by_id.items():
+                    if cold.get(asin):
+                        by_product[product_id] = [self._history_point(row) for row in cold[asin]]
+                for data in result:
+                    by_product.setdefault(data.product_id, []).append(self._history_point(data._mapping))
+                await self._add_window_edges(session, asin_by_id, start_date, by_product)
+        
+        histories = {}
+        for product_id, asin in asin_by_id.items():
+            history = by_product.get(product_id, [])
+            if max_points and len(history) > max_points:
+                history = lttb(history, max_points, x=lambda p: datetime.fromisoformat(p["date"]).timestamp(), y=lambda p: p["price"])
+            histories[asin] = history
+        return histories
     
-    async def get_trending_products(self, limit: int = 10) -> List[Dict]:
+    async def _add_window_edges(self, session, asin_by_id: Dict[int, str], start_date: datetime, by_product: Dict[int, List[Dict]]):
+        """Open each raw history at start_date with the price then in effect and close it at the last poll
+        
+        With deduplication a stable price has no rows inside the window at all, and
+        even a changing one would otherwise start at its first change and stop at its last.
+        """
+        product_ids = list(asin_by_id)
+        result = await session.execute(
+            select(
+                ProductLatestPrice.product_id,
+                ProductLatestPrice.current_price,
+                ProductLatestPrice.original_price,
+                ProductLatestPrice.availability,
+                ProductLatestPrice.last_seen_at
+            ).where(ProductLatestPrice.product_id.in_(product_ids))
+        )
+        # Products no longer polled inside the window have no price to carry through it
+        latest = {row.product_id: row._mapping for row in result if row.last_seen_at is not None and row.last_seen_at >= start_date}
+        if not latest:
+            return
+        
+        before = select(
+            PriceData.product_id,
+            func.max(PriceData.tracked_at).label("tracked_at")
+        ).where(
+            PriceData.product_id.in_(list(latest)),
+            PriceData.tracked_at < start_date
+        ).group_by(PriceData.product_id).subquery()
+        result = await session.execute(
+            select(
+                PriceData.product_id,
+                PriceData.current_price,
+                PriceData.original_price,
+                PriceData.availability
+            ).join(before, and_(PriceData.product_id == before.c.product_id, PriceData.tracked_at == before.c.tracked_at))
+        )
+        opening = {row.product_id: dict(row._mapping) for row in result}
+        # Rows compacted into the archive are older than any hot row, so the archive only matters without one
+        missing = [asin_by_id[product_id] for product_id in latest if product_id not in opening]
+        if missing:
+            archived = await asyncio.to_thread(self._read_cold_before, missing, start_date)
+            for product_id in latest:
+                row = archived.get(asin_by_id[product_id])
+                if row is not None:
+                    opening[product_id] = row
+        
+        for product_id, closing in latest.items():
+            history = by_product.setdefault(product_id, [])
+            if product_id in opening and (not history or datetime.fromisoformat(history[0]["date"]) > start_date):
+                history.insert(0, self._history_point({**opening[product_id], "tracked_at": start_date}))
+            if not history or datetime.fromisoformat(history[-1]["date"]) < closing["last_seen_at"]:
+                history.append(self._history_point({**closing, "tracked_at": closing["last_seen_at"]}))
+    
+    def history_start(self, days: int) -> datetime:
+        """Start of the history window, floored to the hour so responses only change when data does, or hourly"""
+        return (datetime.utcnow() - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    
+    async def get_history_version(self, asin: str) -> Optional[datetime]:
+        """When the stored history of a product last changed, or None for unknown products"""
+        async with session_scope() as session:
+            row = (await session.execute(
+                select(ProductLatestPrice.last_seen_at).where(ProductLatestPrice.asin == asin)
+            )).first()
+        if row is None:
+            return None
+        # Every poll moves a rollup bucket or the closing point of a raw history
+        return row.last_seen_at
+    
+    def _read_cold(self, asins: List[str], start_date: datetime) -> Dict[str, List[Dict]]:
+        """Archived observations since start_date, memory-mapped from the cold segments"""
+        return {asin: cold_archive.read(asin, start_date) for asin in asins}
+    
+    def _read_cold_before(self, asins: List[str], start_date: datetime) -> Dict[str, Dict]:
+        """Newest archived observation before start_date for each ASIN that has one"""
+        newest = {}
+        for asin in asins:
+            rows = cold_archive.read(asin, end=start_date)
+            if rows:
+                newest[asin] = rows[-1]
+        return newest
+    
+    def _history_point(self, row) -> Dict:
+        return {
+            "date": row["tracked_at"].isoformat(),
+            "price": float(row["current_price"]),
+            "original_price": float(row["original_price"]),
+            "availability": row["availability"]
+        }
+    
+    def _pick_resolution(self, days: int, max_points: Optional[int]) -> str:
+        """Finest resolution whose bucket count fits in max_points"""
+        if not max_points:
+            return "raw"
+        if days * 24 <= max_points:
+            return "hourly"
+        return "daily"
+    
+    async def get_trending_products(self, limit: int = 10, category: Optional[str] = None) -> List[Dict]:
         """Get trending products based on price drops"""
         try:
-            # Get products with recent price drops
-            trending = self.db.query(Product, PriceData).join(PriceData).filter(
-                PriceData.tracked_at >= datetime.utcnow() - timedelta(days=7)
-            ).order_by(PriceData.tracked_at.desc()).limit(limit).all()
-            
-            return [
-                {
-                    "asin": product.asin,
-                    "title": product.title,
-                    "brand": product.brand,
-                    "image_url": product.image_url,
-                    "affiliate_url": product.affiliate_url,
-                    "current_price": float(price_data.current_price),
-                    "original_price": float(price_data.original_price),
-                    "price_drop": float(price_data.original_price - price_data.current_price),
-                    "price_drop_percent": float((price_data.original_price - price_data.current_price) / price_data.original_price * 100) if price_data.original_price > 0 else 0
-                }
-                for product, price_data in trending
-            ]
-            
-        except Exception as e:
-            print(f"Error getting trending products: {e}")
+            return await trending_engine.top(limit, category)
+        except Exception:
+            logger.exception("trending_failed", extra={"category": category})
             return []
 
 # Global instance
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.services.observability import get_logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional, the in-process tier works on its own
+    aioredis = None
+
+logger = get_logger("product_cache")
+
+class ProductCache:
+    """Read-through product cache: in-process LRU, optional Redis tier, single-flight fetches"""
+    
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        redis_url: Optional[str] = None
+    ):
+        # Entries are fresh for `ttl` seconds, then served stale for `stale_ttl` more while refreshing
+        self.ttl = ttl if ttl is not None else float(os.getenv("PRODUCT_CACHE_TTL", "900"))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv("PRODUCT_CACHE_STALE_TTL", "3600"))
+        self.max_entries = max_entries or int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "10000"))
+        self.max_bytes = max_bytes or int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        
+        # key -> (value, stored_at, size in bytes)
+        self._entries: "OrderedDict[str, Tuple[Dict, float, int]]" = OrderedDict()
+        self._bytes = 0
+        # Single fetches register a Task, batched fetches one Future per key
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._batch_tasks = set()
+        
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+        
+        redis_url = redis_url if redis_url is not None else os.getenv("PRODUCT_CACHE_REDIS_URL")
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("redis_unavailable", extra={"detail": "PRODUCT_CACHE_REDIS_URL is set but the redis package is not installed, using the in-process cache only"})
+            else:
+                self._redis = aioredis.from_url(redis_url)
+    
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        """Return the cached value for key, fetching it at most once across concurrent callers"""
+        entry = await self._lookup(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                # Serve stale now and refresh in the background
+                self.stale_hits += 1
+                self._fetch_once(key, fetch)
+                return value
+        
+        self.misses += 1
+        return await self._fetch_once(key, fetch)
+    
+    async def get_or_fetch_many(self, keys: List[str], fetch_many: Callable[[List[str]], Awaitable[Dict[str, Dict]]]) -> Dict[str, Dict]:
+        """Return cached values for keys, fetching every miss in one fetch_many call; keys not found are left out"""
+        values = {}
+        stale = []
+        missing = []
+        waiting: Dict[str, asyncio.Future] = {}
+        for key in dict.fromkeys(keys):
+            entry = await self._lookup(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.time() - stored_at
+                if age < self.ttl:
+                    self.hits += 1
+                    values[key] = value
+                    continue
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    values[key] = value
+                    if key not in self._inflight:
+                        stale.append(key)
+                    continue
+            
+            self.misses += 1
+            if key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key]
+            else:
+                missing.append(key)
+        
+        if stale:
+            # Serve stale now and refresh them together in the background
+            self._fetch_many_once(stale, fetch_many)
+        if missing:
+            waiting.update(self._fetch_many_once(missing, fetch_many))
+        
+        for key, future in waiting.items():
+            try:
+                value = await future
+            except Exception:
+                continue
+            if value is not None:
+                values[key] = value
+        return values
+    
+    async def set(self, key: str, value: Dict):
+        """Store a value in every tier"""
+        stored_at = time.time()
+        self._set_local(key, value, stored_at)
+        await self._set_redis(key, value, stored_at)
+    
+    async def invalidate(self, key: str):
+        """Drop a key from every tier"""
+        self._pop_local(key)
+        if self._redis is not None:
+            try:
+                await self._redis.delete(self._redis_key(key))
+            except Exception as e:
+                logger.warning("cache_invalidate_failed", extra={"key": key, "error": str(e)})
+    
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refresh_errors": self.refresh_errors,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "redis_enabled": self._redis is not None
+        }
+    
+    def _fetch_once(self, key: str, fetch: Callable[[], Awaitable[Optional[Dict]]]) -> "asyncio.Task":
+        """Start a fetch for key unless one is already running, and return the shared task"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        
+        async def run():
+            try:
+                value = await fetch()
+                if value is not None:
+                    await self.set(key, value)
+                return value
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("cache_fetch_failed", extra={"key": key, "error": str(e)})
+                raise
+            finally:
+                self._inflight.pop(key, None)
+        
+        task = asyncio.create_task(run())
+        # Background refreshes may never be awaited, keep their errors from being reported as lost
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+    
+    def _fetch_many_once(self, keys: List[str], fetch_many: Callable[[List[str]], Awaitable[Dict[str, Dict]]]) -> Dict[str, asyncio.Future]:
+        """Start one fetch for several keys, registering a per-key future so single lookups coalesce onto it"""
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        
+        async def run():
+            try:
+                fetched = await fetch_many(keys)
+                for key in keys:
+                    value = fetched.get(key)
+                    if value is not None:
+                        await self.set(key, value)
+                    futures[key].set_result(value)
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("cache_fetch_failed", extra={"keys": len(keys), "error": str(e)})
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for key in keys:
+                    if self._inflight.get(key) is futures[key]:
+                        del self._inflight[key]
+        
+        for key, future in futures.items():
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[key] = future
+        task = asyncio.create_task(run())
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+        return futures
+    
+    async def _lookup(self, key: str) -> Optional[Tuple[Dict, float]]:
+        """Find key in the local tier, then Redis, promoting Redis hits to local"""
+        entry = self._get_local(key)
+        if entry is None:
+            entry = await self._get_redis(key)
+            if entry is not None:
+                self._set_local(key, *entry)
+        return entry
+    
+    def _get_local(self, key: str) -> Optional[Tuple[Dict, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        value, stored_at, _ = entry
+        return value, stored_at
+    
+    def _set_local(self, key: str, value: Dict, stored_at: float):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        self._pop_local(key)
+        self._entries[key] = (value, stored_at, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+    
+    def _pop_local(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+    
+    def _redis_key(self, key: str) -> str:
+        return f"zobda:cache:{key}"
+    
+    async def _get_redis(self, key: str) -> Optional[Tuple[Dict, float]]:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self._redis_key(key))
+            if raw is None:
+                return None
+            payload = json.loads(raw)
+            return payload["value"], payload["stored_at"]
+        except Exception as e:
+            logger.warning("cache_redis_read_failed", extra={"key": key, "error": str(e)})
+            return None
+    
+    async def _set_redis(self, key: str, value: Dict, stored_at: float):
+        if self._redis is None:
+            return
+        try:
+            payload = json.dumps({"value": value, "stored_at": stored_at}, default=str)
+            await self._redis.set(self._redis_key(key), payload, ex=int(self.ttl + self.stale_ttl))
+        except Exception as e:
+            logger.warning("cache_redis_write_failed", extra={"key": key, "error": str(e)})
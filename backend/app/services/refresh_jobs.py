@@ -0,0 +1,147 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+from app.services.observability import get_logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional, progress is then only visible in this process
+    aioredis = None
+
+logger = get_logger("refresh_jobs")
+
+# Job progress outlives the job by a week for the admin dashboard
+JOB_TTL_SECONDS = 7 * 86400
+RECENT_JOBS = 100
+
+# Adds one task's results at most once: a task redelivered under acks_late finds its id
+# already in the job's task set and changes nothing. Returns 1 if recorded, 0 if a repeat.
+RECORD_SCRIPT = """
+if redis.call('SADD', KEYS[2], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('HINCRBY', KEYS[1], 'tasks_done', 1)
+redis.call('HINCRBY', KEYS[1], 'done', ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'saved', ARGV[3])
+redis.call('HINCRBY', KEYS[1], 'failed', ARGV[4])
+for reason, count in pairs(cjson.decode(ARGV[6])) do
+    redis.call('HINCRBY', KEYS[3], reason, count)
+end
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+for i = 7, #ARGV do
+    redis.call('SADD', KEYS[4], ARGV[i])
+end
+if #ARGV >= 7 then
+    redis.call('EXPIRE', KEYS[4], ARGV[5])
+end
+return 1
+"""
+
+class RefreshJobs:
+    """Progress of refresh jobs fanned out to workers, in Redis or in process memory"""
+    
+    def __init__(self, redis_url: Optional[str] = None):
+        redis_url = redis_url if redis_url is not None else os.getenv("REFRESH_JOBS_REDIS_URL")
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("redis_unavailable", extra={"detail": "REFRESH_JOBS_REDIS_URL is set but the redis package is not installed, keeping job progress in process"})
+            else:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+                self._record = self._redis.register_script(RECORD_SCRIPT)
+        
+        # In-process fallback, same shape as the Redis hashes
+        self._jobs: Dict[str, Dict] = {}
+        self._failures: Dict[str, Dict[str, int]] = {}
+        self._failed_asins: Dict[str, set] = {}
+        self._recorded_tasks: Dict[str, set] = {}
+        self._recent: List[str] = []
+    
+    def _key(self, job_id: str, part: str = "") -> str:
+        return f"zobda:refresh_job:{job_id}{':' + part if part else ''}"
+    
+    async def create(self, job_id: str, total: int, tasks: int):
+        job = {"job_id": job_id, "created_at": time.time(), "total": total, "tasks": tasks, "tasks_done": 0, "done": 0, "saved": 0, "failed": 0}
+        if self._redis is None:
+            self._jobs[job_id] = job
+            self._recent = [job_id] + self._recent[:RECENT_JOBS - 1]
+            for old_id in set(self._jobs) - set(self._recent):
+                self._jobs.pop(old_id, None)
+                self._failures.pop(old_id, None)
+                self._failed_asins.pop(old_id, None)
+                self._recorded_tasks.pop(old_id, None)
+            return
+        
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping=job)
+            pipe.expire(self._key(job_id), JOB_TTL_SECONDS)
+            pipe.lpush("zobda:refresh_jobs", job_id)
+            pipe.ltrim("zobda:refresh_jobs", 0, RECENT_JOBS - 1)
+            await pipe.execute()
+    
+    async def record(self, job_id: str, task_id: str, results: Dict[str, bool], failures_by_reason: Dict[str, int]) -> bool:
+        """Add one finished task's results to its job; False if that task was already recorded"""
+        failed = [asin for asin, ok in results.items() if not ok]
+        saved = len(results) - len(failed)
+        if self._redis is None:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            recorded = self._recorded_tasks.setdefault(job_id, set())
+            if task_id in recorded:
+                return False
+            recorded.add(task_id)
+            job["tasks_done"] += 1
+            job["done"] += len(results)
+            job["saved"] += saved
+            job["failed"] += len(failed)
+            reasons = self._failures.setdefault(job_id, {})
+            for reason, count in failures_by_reason.items():
+                reasons[reason] = reasons.get(reason, 0) + count
+            self._failed_asins.setdefault(job_id, set()).update(failed)
+            return True
+        
+        # Counters only, so concurrent tasks never overwrite each other
+        recorded = await self._record(
+            keys=[self._key(job_id), self._key(job_id, "tasks"), self._key(job_id, "failures"), self._key(job_id, "failed_asins")],
+            args=[task_id, len(results), saved, len(failed), JOB_TTL_SECONDS, json.dumps(failures_by_reason), *failed]
+        )
+        return bool(int(recorded))
+    
+    async def get(self, job_id: str, include_failed_asins: bool = False) -> Optional[Dict]:
+        """Progress of one job, or None if unknown or expired"""
+        if self._redis is None:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            failures = dict(self._failures.get(job_id, {}))
+            failed_asins = set(self._failed_asins.get(job_id, set()))
+        else:
+            raw = await self._redis.hgetall(self._key(job_id))
+            if not raw:
+                return None
+            job = {key: (value if key == "job_id" else float(value) if key == "created_at" else int(value)) for key, value in raw.items()}
+            failures = {reason: int(count) for reason, count in (await self._redis.hgetall(self._key(job_id, "failures"))).items()}
+            failed_asins = await self._redis.smembers(self._key(job_id, "failed_asins")) if include_failed_asins else set()
+        
+        job["status"] = "done" if job["tasks_done"] >= job["tasks"] else "running"
+        job["progress"] = round(job["done"] / job["total"], 4) if job["total"] else 1.0
+        job["failures_by_reason"] = failures
+        if include_failed_asins:
+            job["failed_asins"] = sorted(failed_asins)
+        return job
+    
+    async def recent(self, limit: int = 20) -> List[Dict]:
+        """Most recent jobs first"""
+        if self._redis is None:
+            job_ids = self._recent[:limit]
+        else:
+            job_ids = await self._redis.lrange("zobda:refresh_jobs", 0, limit - 1)
+        jobs = [await self.get(job_id) for job_id in job_ids]
+        return [job for job in jobs if job is not None]
+
+# Global instance
+refresh_jobs = RefreshJobs()
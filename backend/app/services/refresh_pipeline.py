@@ -0,0 +1,280 @@
+import asyncio
+import os
+import random
+import time
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.amazon_api import MAX_ITEMS_PER_REQUEST, THROTTLE_STATUS_CODES
+from app.services.distributed_limiter import RedisTokenBucket, aioredis
+from app.services.observability import get_logger
+
+logger = get_logger("refresh_pipeline")
+
+# Marks the end of a queue for the stage reading it
+_DONE = object()
+
+class TokenBucket:
+    """Async token bucket that follows the PA-API TPS and TPD quota"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None, per_day: Optional[int] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate / 16
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.per_day = per_day
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.day = date.today()
+        self.used_today = 0
+        self._lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    async def acquire(self) -> bool:
+        """Wait for one request token; returns False once the daily quota is used up"""
+        async with self._lock:
+            today = date.today()
+            if today != self.day:
+                self.day = today
+                self.used_today = 0
+            if self.per_day is not None and self.used_today >= self.per_day:
+                return False
+            
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            
+            self.tokens -= 1
+            self.used_today += 1
+            return True
+    
+    def on_throttled(self):
+        """Multiplicative decrease after a 429/503"""
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+    
+    def on_success(self):
+        """Additive increase back towards the configured rate"""
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+def build_rate_limiter(rate: float, per_day: Optional[int]):
+    """Redis-backed bucket shared by all workers when AMAZON_RATE_LIMIT_REDIS_URL is set, otherwise per process"""
+    redis_url = os.getenv("AMAZON_RATE_LIMIT_REDIS_URL")
+    if redis_url:
+        if aioredis is None:
+            logger.warning("redis_unavailable", extra={"detail": "AMAZON_RATE_LIMIT_REDIS_URL is set but the redis package is not installed, limiting per process"})
+        else:
+            return RedisTokenBucket(redis_url, rate, per_day=per_day)
+    return TokenBucket(rate, per_day=per_day)
+
+class RefreshStats:
+    """Counters for a single tracking run"""
+    
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.asins = 0
+        self.saved = 0
+        self.requests = 0
+        self.requests_by_profile: Dict[str, int] = {}
+        self.retries = 0
+        self.throttled = 0
+        self.failures_by_reason: Dict[str, int] = {}
+    
+    def record_failure(self, reason: str, count: int = 1):
+        self.failures_by_reason[reason] = self.failures_by_reason.get(reason, 0) + count
+    
+    def finish(self):
+        self.finished_at = time.monotonic()
+    
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+    
+    def to_dict(self) -> Dict:
+        elapsed = self.elapsed
+        return {
+            "asins": self.asins,
+            "saved": self.saved,
+            "failed": sum(self.failures_by_reason.values()),
+            "requests": self.requests,
+            "requests_by_profile": dict(self.requests_by_profile),
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "elapsed_seconds": round(elapsed, 3),
+            "asins_per_second": round(self.asins / elapsed, 2) if elapsed > 0 else 0.0,
+            "failures_by_reason": dict(self.failures_by_reason)
+        }
+
+class RefreshPipeline:
+    """Fetch, parse and persist stages connected by bounded queues"""
+    
+    def __init__(
+        self,
+        api,
+        save_batch: Callable[[List[Tuple[str, object]]], Awaitable[Dict[str, bool]]],
+        limiter: Optional[TokenBucket] = None,
+        max_in_flight: Optional[int] = None,
+        persist_batch_size: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0
+    ):
+        self.api = api
+        self.save_batch = save_batch
+        self.limiter = limiter or build_rate_limiter(
+            rate=float(os.getenv("AMAZON_TPS", "1")),
+            per_day=int(os.getenv("AMAZON_TPD", "8640"))
+        )
+        self.max_in_flight = max_in_flight or int(os.getenv("TRACKER_MAX_IN_FLIGHT", "4"))
+        self.persist_batch_size = persist_batch_size or int(os.getenv("TRACKER_PERSIST_BATCH_SIZE", "200"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("TRACKER_MAX_RETRIES", "5"))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    async def run(self, asins: List[str], profiles: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, bool], RefreshStats]:
+        """Refresh every ASIN with its resource profile ("full" by default) and return per-ASIN success plus run stats"""
+        unique_asins = list(dict.fromkeys(asins))
+        stats = RefreshStats()
+        stats.asins = len(unique_asins)
+        results = {asin: False for asin in unique_asins}
+        
+        batch_queue: asyncio.Queue = asyncio.Queue()
+        parse_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight * 2)
+        persist_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight * MAX_ITEMS_PER_REQUEST * 2)
+        
+        # A GetItems request has one resource list, so batches never mix profiles
+        by_profile: Dict[str, List[str]] = {}
+        for asin in unique_asins:
+            by_profile.setdefault((profiles or {}).get(asin, "full"), []).append(asin)
+        for profile, profile_asins in by_profile.items():
+            for i in range(0, len(profile_asins), MAX_ITEMS_PER_REQUEST):
+                batch_queue.put_nowait((profile, profile_asins[i:i + MAX_ITEMS_PER_REQUEST]))
+        fetchers = max(1, min(self.max_in_flight, batch_queue.qsize()))
+        for _ in range(fetchers):
+            batch_queue.put_nowait(_DONE)
+        
+        fetch_tasks = [
+            asyncio.create_task(self._fetch_stage(batch_queue, parse_queue, stats))
+            for _ in range(fetchers)
+        ]
+        parse_task = asyncio.create_task(self._parse_stage(parse_queue, persist_queue, stats))
+        persist_task = asyncio.create_task(self._persist_stage(persist_queue, results, stats))
+        
+        try:
+            await asyncio.gather(*fetch_tasks)
+            await parse_queue.put(_DONE)
+            await parse_task
+            await persist_queue.put(_DONE)
+            await persist_task
+        finally:
+            for task in fetch_tasks + [parse_task, persist_task]:
+                task.cancel()
+            stats.finish()
+        
+        return results, stats
+    
+    async def _fetch_stage(self, batch_queue: asyncio.Queue, parse_queue: asyncio.Queue, stats: RefreshStats):
+        while True:
+            item = await batch_queue.get()
+            if item is _DONE:
+                return
+            profile, batch = item
+            
+            attempt = 0
+            while True:
+                if not await self.limiter.acquire():
+                    stats.record_failure("DailyQuotaExhausted", len(batch))
+                    break
+                
+                stats.requests += 1
+                stats.requests_by_profile[profile] = stats.requests_by_profile.get(profile, 0) + 1
+                try:
+                    status_code, data = await self.api.fetch_items_raw(batch, profile)
+                except Exception as e:
+                    status_code, data = None, {"error": str(e)}
+                
+                if status_code == 200:
+                    self.limiter.on_success()
+                    await parse_queue.put((profile, batch, data))
+                    break
+                
+                retryable = status_code is None or status_code in THROTTLE_STATUS_CODES
+                if status_code in THROTTLE_STATUS_CODES:
+                    stats.throttled += 1
+                    self.limiter.on_throttled()
+                
+                if not retryable or attempt >= self.max_retries:
+                    reason = f"HTTP {status_code}" if status_code is not None else "NetworkError"
+                    logger.error("batch_failed", extra={"asins": batch, "profile": profile, "reason": reason, "body": data})
+                    stats.record_failure(reason, len(batch))
+                    break
+                
+                stats.retries += 1
+                await asyncio.sleep(self._backoff_delay(attempt))
+                attempt += 1
+    
+    async def _parse_stage(self, parse_queue: asyncio.Queue, persist_queue: asyncio.Queue, stats: RefreshStats):
+        while True:
+            item = await parse_queue.get()
+            if item is _DONE:
+                return
+            
+            profile, batch, data = item
+            try:
+                # Price polls skip the Pydantic models and yield plain price dicts
+                if profile == "price":
+                    products, errors = self.api.parse_prices_response(data, batch)
+                else:
+                    products, errors = self.api.parse_items_response(data, batch)
+            except Exception:
+                logger.exception("batch_parse_failed", extra={"asins": batch, "profile": profile})
+                stats.record_failure("ParseError", len(batch))
+                continue
+            
+            for asin, reason in errors.items():
+                stats.record_failure(reason)
+            for asin, product in products.items():
+                if product is not None:
+                    await persist_queue.put((asin, product))
+    
+    async def _persist_stage(self, persist_queue: asyncio.Queue, results: Dict[str, bool], stats: RefreshStats):
+        done = False
+        while not done:
+            item = await persist_queue.get()
+            
+            # Drain whatever is already queued into one write batch
+            batch = []
+            while True:
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.persist_batch_size or persist_queue.empty():
+                    break
+                item = persist_queue.get_nowait()
+            
+            if not batch:
+                continue
+            
+            try:
+                saved = await self.save_batch(batch)
+            except Exception:
+                # Keep draining, a dead persist stage would leave the fetchers blocked on full queues
+                logger.exception("batch_save_failed", extra={"asins": [asin for asin, _ in batch]})
+                saved = {}
+            for asin, _ in batch:
+                if saved.get(asin):
+                    results[asin] = True
+                    stats.saved += 1
+                else:
+                    stats.record_failure("SaveError")
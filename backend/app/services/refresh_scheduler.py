@@ -0,0 +1,330 @@
+import asyncio
+import heapq
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import func, select
+from app.database import session_scope
+from app.models.price_data import PriceRollupDaily, Product, ProductLatestPrice, UserWatchlist
+from app.services.amazon_api import MAX_ITEMS_PER_REQUEST
+from app.services.observability import get_logger
+
+logger = get_logger("refresh_scheduler")
+
+CURATION_BOOST = {"high": 0.3, "medium": 0.2, "low": 0.1}
+
+# Days of daily rollups used for the initial volatility estimate
+VOLATILITY_DAYS = 14
+# A 5% intraday range, or a change on every poll, counts as fully volatile
+VOLATILE_RANGE = 0.05
+# Smoothing for the per-poll change rate
+CHANGE_RATE_ALPHA = 0.2
+# Consecutive failed refreshes before a listing is treated as dead
+DEAD_AFTER_FAILURES = 3
+
+class AsinSchedule:
+    """Polling state for one ASIN"""
+    
+    __slots__ = (
+        "asin", "curation", "watchers", "alerts", "daily_range", "change_rate",
+        "views", "views_at", "failures", "unavailable", "interval", "next_due"
+    )
+    
+    def __init__(self, asin: str):
+        self.asin = asin
+        self.curation: Optional[str] = None
+        self.watchers = 0
+        self.alerts = 0
+        self.daily_range = 0.0
+        self.change_rate = 0.0
+        self.views = 0.0
+        self.views_at = time.monotonic()
+        self.failures = 0
+        self.unavailable = False
+        self.interval = 0.0
+        # None until first scheduled and while a refresh is in flight
+        self.next_due: Optional[float] = None
+
+class RefreshScheduler:
+    """Refreshes tracked ASINs from a priority queue keyed on next-due time, with per-ASIN adaptive intervals"""
+    
+    def __init__(
+        self,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        daily_budget: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        rebuild_seconds: Optional[float] = None,
+        view_half_life_hours: Optional[float] = None
+    ):
+        self.enabled = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
+        self.min_interval = min_interval or float(os.getenv("SCHEDULER_MIN_INTERVAL", "300"))
+        self.max_interval = max_interval or float(os.getenv("SCHEDULER_MAX_INTERVAL", "86400"))
+        # PA-API requests per day the scheduler may spend; the rest of AMAZON_TPD is left for ad hoc calls
+        default_budget = int(int(os.getenv("AMAZON_TPD", "8640")) * 0.8)
+        self.daily_budget = daily_budget or int(os.getenv("SCHEDULER_DAILY_BUDGET", str(default_budget)))
+        self.batch_size = batch_size or int(os.getenv("SCHEDULER_BATCH_SIZE", "100"))
+        self.rebuild_seconds = rebuild_seconds if rebuild_seconds is not None else float(os.getenv("SCHEDULER_REBUILD_SECONDS", "600"))
+        self.view_half_life = 3600 * (view_half_life_hours or float(os.getenv("SCHEDULER_VIEW_HALF_LIFE_HOURS", "24")))
+        
+        self._entries: Dict[str, AsinSchedule] = {}
+        # (next_due, asin); stale entries are skipped when popped
+        self._heap: List = []
+        # Polls per second all ASINs ask for at their unscaled intervals
+        self._demand = 0.0
+        self._built_at: Optional[float] = None
+        self._rebuild_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._in_flight = set()
+        self._refresh: Optional[Callable[[List[str]], Awaitable[Dict[str, bool]]]] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        self.runs = 0
+        self.refreshed = 0
+        self.failed = 0
+    
+    @property
+    def capacity(self) -> float:
+        """ASIN polls per second the budget allows"""
+        return self.daily_budget * MAX_ITEMS_PER_REQUEST / 86400
+    
+    @property
+    def budget_scale(self) -> float:
+        """Factor every interval is stretched by so total demand fits the budget"""
+        return max(1.0, self._demand / self.capacity) if self.capacity > 0 else 1.0
+    
+    def _priority(self, entry: AsinSchedule) -> float:
+        """0 (poll rarely) to 1 (poll as often as allowed)"""
+        if entry.unavailable or entry.failures >= DEAD_AFTER_FAILURES:
+            return 0.0
+        volatility = max(min(1.0, entry.daily_range / VOLATILE_RANGE), entry.change_rate)
+        watch = min(1.0, math.log1p(entry.watchers + 2 * entry.alerts) / math.log1p(50))
+        views = min(1.0, math.log1p(self._decayed_views(entry)) / math.log1p(100))
+        score = 0.5 * volatility + 0.3 * watch + 0.2 * views + CURATION_BOOST.get(entry.curation, 0.0)
+        return min(1.0, score)
+    
+    def _base_interval(self, entry: AsinSchedule) -> float:
+        # Geometric between the bounds, so each step of priority is the same ratio of polling rate
+        return self.max_interval * (self.min_interval / self.max_interval) ** self._priority(entry)
+    
+    def _decayed_views(self, entry: AsinSchedule) -> float:
+        now = time.monotonic()
+        entry.views *= 0.5 ** ((now - entry.views_at) / self.view_half_life)
+        entry.views_at = now
+        return entry.views
+    
+    def _update_interval(self, entry: AsinSchedule):
+        if entry.interval:
+            self._demand -= 1 / entry.interval
+        entry.interval = self._base_interval(entry)
+        self._demand += 1 / entry.interval
+    
+    def _schedule(self, entry: AsinSchedule, due: float):
+        entry.next_due = due
+        heapq.heappush(self._heap, (due, entry.asin))
+        if self._heap[0][1] == entry.asin:
+            self._wakeup.set()
+    
+    def _reschedule(self, entry: AsinSchedule, last_refreshed: Optional[float] = None):
+        """Recompute the interval and schedule the next poll after last_refreshed"""
+        self._update_interval(entry)
+        self._schedule(entry, (last_refreshed or time.monotonic()) + entry.interval * self.budget_scale)
+    
+    def _pop_due(self, limit: int) -> List[str]:
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            next_due, asin = heapq.heappop(self._heap)
+            entry = self._entries.get(asin)
+            if entry is None or entry.next_due != next_due:
+                continue
+            entry.next_due = None
+            self._in_flight.add(asin)
+            due.append(asin)
+        return due
+    
+    def record_view(self, asin: str):
+        """Count a product page or history view; a newly popular ASIN is pulled forward"""
+        entry = self._entries.get(asin) if self._task is not None else None
+        if entry is None:
+            return
+        self._decayed_views(entry)
+        entry.views += 1
+        if entry.next_due is None:
+            return
+        old_interval = entry.interval
+        self._update_interval(entry)
+        if entry.interval < old_interval:
+            due = entry.next_due - (old_interval - entry.interval) * self.budget_scale
+            if due < entry.next_due:
+                self._schedule(entry, due)
+    
+    def observe(self, latest_rows: List[Dict]):
+        """Fold freshly saved observations in, whoever triggered the refresh"""
+        if self._task is None:
+            return
+        now = time.monotonic()
+        for row in latest_rows:
+            entry = self._entries.get(row["asin"])
+            if entry is None:
+                entry = self._entries[row["asin"]] = AsinSchedule(row["asin"])
+            changed = row["previous_price"] is not None and row["tracked_at"] == row["last_seen_at"]
+            entry.change_rate = CHANGE_RATE_ALPHA * changed + (1 - CHANGE_RATE_ALPHA) * entry.change_rate
+            entry.unavailable = not row["current_price"] or row["current_price"] <= 0
+            entry.failures = 0
+            self._reschedule(entry, now)
+    
+    async def rebuild(self):
+        """Reload curation, watchers and volatility for every product, keeping runtime state"""
+        since = (datetime.utcnow() - timedelta(days=VOLATILITY_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+        async with session_scope() as session:
+            products = (await session.execute(
+                select(
+                    Product.asin,
+                    Product.curation_priority,
+                    ProductLatestPrice.last_seen_at,
+                    ProductLatestPrice.current_price
+                ).outerjoin(ProductLatestPrice, ProductLatestPrice.product_id == Product.id)
+            )).all()
+            watchers = {
+                row.asin: row for row in (await session.execute(
+                    select(
+                        UserWatchlist.asin,
+                        func.count().label("watchers"),
+                        func.count(UserWatchlist.alert_price).label("alerts")
+                    ).group_by(UserWatchlist.asin)
+                ))
+            }
+            ranges = dict((await session.execute(
+                select(
+                    PriceRollupDaily.asin,
+                    func.avg((PriceRollupDaily.max_price - PriceRollupDaily.min_price) / (PriceRollupDaily.sum_price / PriceRollupDaily.sample_count))
+                ).where(PriceRollupDaily.bucket_start >= since).group_by(PriceRollupDaily.asin)
+            )).all())
+        
+        now = time.monotonic()
+        utcnow = datetime.utcnow()
+        entries = {}
+        self._demand = 0.0
+        for row in products:
+            entry = self._entries.get(row.asin) or AsinSchedule(row.asin)
+            entry.curation = row.curation_priority
+            watch = watchers.get(row.asin)
+            entry.watchers = watch.watchers if watch else 0
+            entry.alerts = watch.alerts if watch else 0
+            entry.daily_range = ranges.get(row.asin) or 0.0
+            entry.unavailable = row.last_seen_at is not None and (not row.current_price or row.current_price <= 0)
+            entry.interval = 0.0
+            self._update_interval(entry)
+            entries[row.asin] = entry
+            
+            if entry.next_due is None and row.asin not in self._in_flight:
+                # First sight: due one interval after the last poll, with jitter so a restart doesn't poll in one burst
+                elapsed = (utcnow - row.last_seen_at).total_seconds() if row.last_seen_at else math.inf
+                wait = max(0.0, entry.interval * self.budget_scale - elapsed)
+                entry.next_due = now + wait + random.uniform(0, min(entry.interval * 0.1, 600))
+        
+        # ASINs only known from observe() (tracked ad hoc since the last rebuild) stay scheduled
+        for asin, entry in self._entries.items():
+            if asin not in entries:
+                entries[asin] = entry
+                self._demand += 1 / entry.interval if entry.interval else 0.0
+        
+        self._entries = entries
+        self._heap = [(entry.next_due, asin) for asin, entry in entries.items() if entry.next_due is not None]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        self._built_at = now
+    
+    async def ensure_fresh(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_seconds:
+            return
+        async with self._rebuild_lock:
+            if self._built_at is None or time.monotonic() - self._built_at >= self.rebuild_seconds:
+                await self.rebuild()
+    
+    def _complete(self, asin: str, ok: bool):
+        self._in_flight.discard(asin)
+        entry = self._entries.get(asin)
+        if entry is None:
+            return
+        if ok:
+            self.refreshed += 1
+        else:
+            self.failed += 1
+            entry.failures += 1
+        # Successful refreshes were already rescheduled by observe()
+        if not ok or entry.next_due is None:
+            self._reschedule(entry)
+    
+    async def run_forever(self):
+        """Refresh ASINs as they come due until cancelled"""
+        while True:
+            try:
+                await self.ensure_fresh()
+            except Exception:
+                logger.exception("schedule_rebuild_failed")
+            
+            due = self._pop_due(self.batch_size)
+            if not due:
+                wait = self._heap[0][0] - time.monotonic() if self._heap else self.rebuild_seconds
+                self._wakeup.clear()
+                # asyncio.wait rather than wait_for, which can swallow a cancel that races the wakeup
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait([waiter], timeout=max(0.0, min(wait, self.rebuild_seconds)))
+                finally:
+                    waiter.cancel()
+                continue
+            
+            self.runs += 1
+            try:
+                results = await self._refresh(due)
+            except Exception:
+                logger.exception("scheduled_refresh_failed", extra={"asins": len(due)})
+                results = {}
+            for asin in due:
+                self._complete(asin, results.get(asin, False))
+    
+    def start(self, refresh: Callable[[List[str]], Awaitable[Dict[str, bool]]]):
+        """Start polling with refresh, e.g. price_tracker.track_product_prices"""
+        self._refresh = refresh
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def get_stats(self) -> Dict:
+        intervals = sorted(entry.interval * self.budget_scale for entry in self._entries.values() if entry.interval)
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None,
+            "asins": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "overdue": sum(1 for due, asin in self._heap if due <= now and self._entries.get(asin) is not None and self._entries[asin].next_due == due),
+            "daily_budget": self.daily_budget,
+            "requests_per_day_wanted": round(self._demand * 86400 / MAX_ITEMS_PER_REQUEST),
+            "budget_scale": round(self.budget_scale, 3),
+            "interval_seconds": {
+                "min": round(intervals[0]) if intervals else None,
+                "median": round(intervals[len(intervals) // 2]) if intervals else None,
+                "max": round(intervals[-1]) if intervals else None
+            },
+            "runs": self.runs,
+            "refreshed": self.refreshed,
+            "failed": self.failed
+        }
+
+# Global instance
+refresh_scheduler = RefreshScheduler()
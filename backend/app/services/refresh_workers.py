@@ -0,0 +1,140 @@
+import asyncio
+import os
+import uuid
+import zlib
+from typing import Dict, List, Optional
+from celery import Celery
+from app.services.observability import get_logger
+from app.services.price_tracker import price_tracker
+from app.services.refresh_jobs import refresh_jobs
+
+logger = get_logger("refresh_workers")
+
+celery_app = Celery("zobda", broker=os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0"))
+celery_app.conf.update(
+    # memory:// plus eager mode runs everything in the calling process, for local runs and tests
+    task_always_eager=os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() == "true",
+    # Redelivered after a worker crash; saves are upserts and dedup on price, and job progress
+    # records each task id once, so a rerun is harmless
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    broker_connection_retry_on_startup=True
+)
+
+def queue_for(shard: int) -> str:
+    return f"refresh.{shard}"
+
+def task_id_for(job_id: str, task_number: int) -> str:
+    return f"{job_id}:{task_number}"
+
+async def run_refresh(job_id: str, task_id: str, asins: List[str]) -> Dict:
+    """Refresh one task's ASINs in this process and record the outcome on the job"""
+    results = await price_tracker.track_product_prices(asins)
+    failures = (price_tracker.last_run_stats or {}).get("failures_by_reason", {})
+    await refresh_jobs.record(job_id, task_id, results, failures)
+    return {"saved": sum(results.values()), "failed": len(results) - sum(results.values())}
+
+# One event loop per worker process, so pooled DB and HTTP connections survive between tasks
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _run(coro):
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+@celery_app.task(name="zobda.refresh_asins", bind=True)
+def refresh_asins(self, job_id: str, asins: List[str]) -> Dict:
+    # A redelivered message keeps the task id it was published with
+    return _run(run_refresh(job_id, self.request.id, asins))
+
+class RefreshWorkers:
+    """Fans refreshes out to Celery workers, one queue per ASIN-hash shard"""
+    
+    def __init__(self, shards: Optional[int] = None, task_size: Optional[int] = None):
+        self.enabled = os.getenv("WORKERS_ENABLED", "false").lower() == "true"
+        # Each shard queue should be consumed by exactly one worker, so each ASIN has one owner
+        self.shards = shards or int(os.getenv("WORKER_SHARDS", "8"))
+        self.task_size = task_size or int(os.getenv("WORKER_TASK_SIZE", "200"))
+        # Longest refresh() waits on a job; ASINs not reported by then count as failed
+        self.job_timeout = float(os.getenv("WORKER_JOB_TIMEOUT_SECONDS", "1800"))
+        self._local_tasks = set()
+    
+    def validate(self):
+        """Check settings, called by the service container before anything starts"""
+        if self.enabled:
+            self.require_shared_state()
+    
+    def require_shared_state(self):
+        """Refuse to fan out across processes without the Redis state the API and workers share"""
+        if celery_app.conf.task_always_eager:
+            return
+        missing = [name for name in ("REFRESH_JOBS_REDIS_URL", "AMAZON_RATE_LIMIT_REDIS_URL") if not os.getenv(name)]
+        if missing:
+            # Without them job progress never leaves the worker and every worker spends the whole PA-API quota
+            raise ValueError(f"Distributed refresh workers require {' and '.join(missing)}")
+    
+    def shard_for(self, asin: str) -> int:
+        # crc32 rather than hash(), which is salted per process
+        return zlib.crc32(asin.encode()) % self.shards
+    
+    async def submit(self, asins: List[str]) -> Dict:
+        """Queue a refresh job and return its initial progress"""
+        by_shard: Dict[int, List[str]] = {}
+        for asin in dict.fromkeys(asins):
+            by_shard.setdefault(self.shard_for(asin), []).append(asin)
+        tasks = [
+            (shard, shard_asins[i:i + self.task_size])
+            for shard, shard_asins in sorted(by_shard.items())
+            for i in range(0, len(shard_asins), self.task_size)
+        ]
+        
+        job_id = uuid.uuid4().hex
+        await refresh_jobs.create(job_id, sum(len(chunk) for _, chunk in tasks), len(tasks))
+        
+        if celery_app.conf.task_always_eager:
+            # Fake broker: run in this process's loop, in the background like a real worker would
+            async def run_local():
+                for task_number, (_, chunk) in enumerate(tasks):
+                    task_id = task_id_for(job_id, task_number)
+                    try:
+                        await run_refresh(job_id, task_id, chunk)
+                    except Exception:
+                        logger.exception("local_refresh_task_failed", extra={"job_id": job_id, "asins": len(chunk)})
+                        await refresh_jobs.record(job_id, task_id, {asin: False for asin in chunk}, {"WorkerError": len(chunk)})
+            
+            task = asyncio.create_task(run_local())
+            self._local_tasks.add(task)
+            task.add_done_callback(self._local_tasks.discard)
+        else:
+            def publish():
+                for task_number, (shard, chunk) in enumerate(tasks):
+                    refresh_asins.apply_async(args=[job_id, chunk], queue=queue_for(shard), task_id=task_id_for(job_id, task_number))
+            
+            await asyncio.to_thread(publish)
+        
+        return await refresh_jobs.get(job_id)
+    
+    async def refresh(self, asins: List[str], poll_seconds: float = 2.0, timeout: Optional[float] = None) -> Dict[str, bool]:
+        """Submit a job and wait for it, at most timeout seconds; same contract as PriceTracker.track_product_prices"""
+        job = await self.submit(asins)
+        timeout = timeout if timeout is not None else self.job_timeout
+        deadline = asyncio.get_running_loop().time() + timeout if timeout > 0 else None
+        while job["status"] != "done":
+            if deadline is not None and asyncio.get_running_loop().time() >= deadline:
+                break
+            await asyncio.sleep(poll_seconds)
+            job = await refresh_jobs.get(job["job_id"], include_failed_asins=True)
+        if "failed_asins" not in job:
+            job = await refresh_jobs.get(job["job_id"], include_failed_asins=True)
+        
+        failed = set(job["failed_asins"])
+        # Anything a timed-out job hasn't reported yet counts as not refreshed
+        if job["status"] != "done":
+            logger.warning("refresh_job_timed_out", extra={"job_id": job["job_id"], "timeout_seconds": timeout, "done": job["done"], "total": job["total"]})
+            return {asin: False for asin in asins}
+        return {asin: asin not in failed for asin in asins}
+
+# Global instance
+refresh_workers = RefreshWorkers()
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import time
+import uuid
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from app.database import session_scope
+from app.models.price_data import Product, ProductLatestPrice
+
+BASELINES = ("avg_30d", "previous_close")
+
+class RankedSet:
+    """Keys ordered by descending score, with O(log n) lookup for updates"""
+    
+    def __init__(self):
+        self._order: List = []
+        self._scores: Dict[str, float] = {}
+    
+    def __len__(self):
+        return len(self._order)
+    
+    def update(self, key: str, score: float):
+        self.remove(key)
+        self._scores[key] = score
+        insort(self._order, (-score, key))
+    
+    def remove(self, key: str):
+        score = self._scores.pop(key, None)
+        if score is None:
+            return
+        i = bisect_left(self._order, (-score, key))
+        if i < len(self._order) and self._order[i] == (-score, key):
+            self._order.pop(i)
+    
+    def __iter__(self):
+        return (key for _, key in self._order)
+
+class TrendingEngine:
+    """Ranks products by price drop against a baseline, updated incrementally at ingest"""
+    
+    def __init__(self, baseline: Optional[str] = None, min_drop_percent: Optional[float] = None, rebuild_seconds: Optional[float] = None, max_age_days: Optional[int] = None):
+        self.baseline = baseline or os.getenv("TRENDING_BASELINE", "avg_30d")
+        self.min_drop_percent = min_drop_percent if min_drop_percent is not None else float(os.getenv("TRENDING_MIN_DROP_PERCENT", "1"))
+        # Other workers ingest too, so periodically reload from product_latest_prices
+        self.rebuild_seconds = rebuild_seconds if rebuild_seconds is not None else float(os.getenv("TRENDING_REBUILD_SECONDS", "300"))
+        # Products not polled for this long drop out, like the old 7-day window
+        self.max_age = timedelta(days=max_age_days if max_age_days is not None else int(os.getenv("TRENDING_MAX_AGE_DAYS", "7")))
+        
+        self._entries: Dict[str, Dict] = {}
+        self._ranked = RankedSet()
+        self._by_category: Dict[str, RankedSet] = {}
+        self._built_at: Optional[float] = None
+        self._rebuild_lock = asyncio.Lock()
+        # Changes whenever the ranking does; the random part keeps versions from different workers apart
+        self._instance = uuid.uuid4().hex
+        self._changes = 0
+    
+    def validate(self):
+        """Check settings, called by the service container before anything starts"""
+        if self.baseline not in BASELINES:
+            raise ValueError(f"TRENDING_BASELINE must be one of {BASELINES}, got {self.baseline}")
+    
+    @property
+    def version(self) -> str:
+        return f"{self._instance}:{self._changes}"
+    
+    def cutoff(self) -> datetime:
+        """Oldest last_seen_at still listed, floored to the hour so results only age out hourly"""
+        return (datetime.utcnow() - self.max_age).replace(minute=0, second=0, microsecond=0)
+    
+    def _baseline_price(self, latest: Dict) -> Optional[float]:
+        if self.baseline == "previous_close":
+            return latest.get("previous_price")
+        return latest.get("avg_price_30d")
+    
+    def _score(self, latest: Dict, product: Dict) -> Optional[Dict]:
+        """Build a ranked entry, or None if the product isn't currently dropping"""
+        current = latest.get("current_price")
+        baseline = self._baseline_price(latest)
+        if not current or current <= 0 or not baseline or baseline <= 0:
+            return None
+        
+        drop = baseline - current
+        drop_percent = drop / baseline * 100
+        if drop_percent < self.min_drop_percent:
+            return None
+        
+        return {
+            "asin": latest["asin"],
+            "title": product.get("title"),
+            "brand": product.get("brand"),
+            "category": product.get("category") or "",
+            "image_url": product.get("image_url"),
+            "affiliate_url": product.get("affiliate_url"),
+            "current_price": float(current),
+            "original_price": float(latest.get("original_price") or 0),
+            "baseline": self.baseline,
+            "baseline_price": round(float(baseline), 2),
+            "price_drop": round(float(drop), 2),
+            "price_drop_percent": round(float(drop_percent), 2),
+            "last_seen_at": latest.get("last_seen_at")
+        }
+    
+    def _put(self, asin: str, entry: Optional[Dict]):
+        old = self._entries.pop(asin, None)
+        if old != entry:
+            self._changes += 1
+        if old is not None:
+            self._ranked.remove(asin)
+            category_set = self._by_category.get(old["category"])
+            if category_set is not None:
+                category_set.remove(asin)
+        if entry is None:
+            return
+        
+        self._entries[asin] = entry
+        self._ranked.update(asin, entry["price_drop_percent"])
+        self._by_category.setdefault(entry["category"], RankedSet()).update(asin, entry["price_drop_percent"])
+    
+    def observe(self, latest_rows: List[Dict], products: Dict):
+        """Fold freshly written latest-price rows into the ranking"""
+        for latest in latest_rows:
+            product = products.get(latest["asin"])
+            meta = product.dict() if hasattr(product, "dict") else (product or {})
+            self._put(latest["asin"], self._score(latest, meta))
+    
+    async def rebuild(self):
+        """Reload the whole ranking from product_latest_prices in one query"""
+        async with session_scope() as session:
+            result = await session.execute(
+                select(
+                    ProductLatestPrice.__table__,
+                    Product.title,
+                    Product.brand,
+                    Product.category,
+                    Product.image_url,
+                    Product.affiliate_url
+                ).join(Product, Product.id == ProductLatestPrice.product_id).where(
+                    ProductLatestPrice.last_seen_at >= datetime.utcnow() - self.max_age
+                )
+            )
+            rows = [dict(row._mapping) for row in result]
+        
+        self._entries = {}
+        self._ranked = RankedSet()
+        self._by_category = {}
+        for row in rows:
+            self._put(row["asin"], self._score(row, row))
+        self._changes += 1
+        self._built_at = time.monotonic()
+    
+    async def ensure_fresh(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_seconds:
+            return
+        async with self._rebuild_lock:
+            if self._built_at is None or time.monotonic() - self._built_at >= self.rebuild_seconds:
+                await self.rebuild()
+    
+    async def top(self, limit: int = 10, category: Optional[str] = None) -> List[Dict]:
+        """Biggest current price drops, optionally within one category"""
+        await self.ensure_fresh()
+        ranked = self._ranked if category is None else self._by_category.get(category)
+        if ranked is None:
+            return []
+        
+        cutoff = self.cutoff()
+        products = []
+        for asin in ranked:
+            entry = self._entries[asin]
+            if entry["last_seen_at"] is not None and entry["last_seen_at"] < cutoff:
+                continue
+            products.append({key: value for key, value in entry.items() if key != "last_seen_at"})
+            if len(products) >= limit:
+                break
+        return products
+
+# Global instance
+trending_engine = TrendingEngine()
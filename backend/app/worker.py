@@ -0,0 +1,38 @@
+"""Celery worker for sharded price refreshes
+
+    celery -A app.worker worker -Q refresh.0,refresh.1 --concurrency 1
+    python -m app.worker --index 0 --count 4
+
+With --index/--count, worker i of n consumes every n-th shard queue, so each
+shard (and every ASIN in it) has exactly one owner.
+"""
+import argparse
+from app.services.refresh_workers import celery_app, queue_for, refresh_workers
+from app.services.trending import trending_engine
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a refresh worker for its share of the ASIN shards")
+    parser.add_argument("--index", type=int, required=True, help="This worker's position, 0-based")
+    parser.add_argument("--count", type=int, required=True, help="Total number of workers")
+    parser.add_argument("--loglevel", default="info")
+    return parser.parse_args(argv)
+
+def owned_queues(index: int, count: int):
+    return [queue_for(shard) for shard in range(refresh_workers.shards) if shard % count == index]
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        # Workers always run distributed; the trending check is the one the API container runs at startup
+        refresh_workers.require_shared_state()
+        trending_engine.validate()
+    except ValueError as e:
+        raise SystemExit(str(e))
+    queues = owned_queues(args.index, args.count)
+    if not queues:
+        raise SystemExit(f"Worker {args.index} of {args.count} owns no shards, WORKER_SHARDS is {refresh_workers.shards}")
+    # One task at a time per worker; concurrency comes from running more workers
+    celery_app.worker_main([
+        "worker", "-Q", ",".join(queues), "--concurrency", "1",
+        "--hostname", f"refresh{args.index}@%h", "--loglevel", args.loglevel
+    ])
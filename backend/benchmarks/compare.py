@@ -0,0 +1,45 @@
+"""Compare two benchmark result files
+
+    python -m benchmarks.compare baseline.json results.json
+"""
+import argparse
+import json
+from typing import Optional
+
+METRICS = [("throughput_per_second", True), ("p50_ms", False), ("p99_ms", False)]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show per-scenario throughput and latency changes between two runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    return parser.parse_args(argv)
+
+def change(before: float, after: float, higher_is_better: bool) -> Optional[str]:
+    if not before:
+        return None
+    percent = (after - before) / before * 100
+    better = percent > 0 if higher_is_better else percent < 0
+    return f"{percent:+.1f}%" + (" better" if better and abs(percent) >= 1 else " worse" if abs(percent) >= 1 else "")
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    
+    if baseline.get("params") != candidate.get("params"):
+        print("Warning: runs used different parameters, numbers may not be comparable")
+    print(f"baseline  {baseline['git'].get('commit')}  {baseline['created_at']}")
+    print(f"candidate {candidate['git'].get('commit')}  {candidate['created_at']}")
+    print()
+    
+    for name, after in candidate["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            print(f"{name:16} {metric:22} {before[metric]:>12.2f} {after[metric]:>12.2f}  {change(before[metric], after[metric], higher_is_better) or ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Synthetic catalog and price history for benchmarks"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import insert, select
+
+CATEGORIES = ["Electronics", "Home", "Kitchen", "Toys", "Books", "Sports", "Beauty", "Garden"]
+
+def make_asin(i: int) -> str:
+    return f"B{i:09d}"
+
+def _history(rng: random.Random, observations: int, start: datetime, step: timedelta) -> List[Dict]:
+    """A random walk with occasional sales, one point per step"""
+    price = round(rng.uniform(5, 500), 2)
+    list_price = round(price * rng.uniform(1.0, 1.4), 2)
+    points = []
+    for i in range(observations):
+        if rng.random() < 0.05:
+            price = round(list_price * rng.uniform(0.5, 0.8), 2)
+        elif rng.random() < 0.3:
+            price = round(min(list_price, max(1.0, price * rng.uniform(0.95, 1.06))), 2)
+        points.append({
+            "current_price": price,
+            "original_price": list_price,
+            "currency": "USD",
+            "availability": "In Stock" if rng.random() > 0.02 else "Out of Stock",
+            "tracked_at": start + step * i
+        })
+    return points
+
+async def generate(products: int, observations: int, days: int = 90, seed: int = 0, chunk: int = 500) -> List[str]:
+    """Fill an empty database with products x observations price rows plus derived tables; returns the ASINs"""
+    from app.database import session_scope
+    from app.models.price_data import PriceData, Product, ProductLatestPrice
+    from app.services.price_rollups import price_rollups
+    
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    step = timedelta(days=days) / max(observations, 1)
+    asins = [make_asin(i) for i in range(products)]
+    
+    async with session_scope() as session:
+        for offset in range(0, products, chunk):
+            batch = asins[offset:offset + chunk]
+            await session.execute(insert(Product), [
+                {
+                    "asin": asin,
+                    "title": f"Synthetic product {asin}",
+                    "brand": f"Brand {rng.randrange(200)}",
+                    "category": rng.choice(CATEGORIES),
+                    "image_url": f"https://example.com/{asin}.jpg",
+                    "affiliate_url": f"https://www.amazon.com/dp/{asin}",
+                    "created_at": start,
+                    "updated_at": now,
+                    "last_seen_at": now
+                }
+                for asin in batch
+            ])
+        await session.commit()
+        
+        ids = dict((await session.execute(select(Product.asin, Product.id))).all())
+        for offset in range(0, products, chunk):
+            price_rows, latest_rows = [], []
+            for asin in asins[offset:offset + chunk]:
+                history = _history(rng, observations, start, step)
+                price_rows.extend({"product_id": ids[asin], "asin": asin, **point} for point in history)
+                if not history:
+                    continue
+                last = history[-1]
+                low = min(history, key=lambda point: point["current_price"])
+                high = max(history, key=lambda point: point["current_price"])
+                recent = [point["current_price"] for point in history if point["tracked_at"] >= now - timedelta(days=30)]
+                latest_rows.append({
+                    "product_id": ids[asin],
+                    "asin": asin,
+                    "current_price": last["current_price"],
+                    "original_price": last["original_price"],
+                    "currency": "USD",
+                    "availability": last["availability"],
+                    "previous_price": history[-2]["current_price"] if len(history) > 1 else None,
+                    "tracked_at": last["tracked_at"],
+                    "last_seen_at": last["tracked_at"],
+                    "lowest_price": low["current_price"],
+                    "lowest_price_at": low["tracked_at"],
+                    "highest_price": high["current_price"],
+                    "highest_price_at": high["tracked_at"],
+                    "avg_price_30d": sum(recent) / len(recent) if recent else None
+                })
+            if price_rows:
+                await session.execute(insert(PriceData), price_rows)
+            if latest_rows:
+                await session.execute(insert(ProductLatestPrice), latest_rows)
+            await session.commit()
+        
+        await price_rollups.backfill(session)
+    
+    return asins
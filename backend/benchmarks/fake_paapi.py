@@ -0,0 +1,104 @@
+"""Stand-in for the PA-API GetItems endpoint, served through httpx.MockTransport"""
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+import httpx
+
+class FakePaapi:
+    """Answers GetItems with synthetic items, with configurable latency, throttling and partial errors"""
+    
+    def __init__(
+        self,
+        latency_ms: float = 80,
+        jitter_ms: float = 40,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        price_change_rate: float = 0.2,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Share of requests answered 429, and of ASINs reported as invalid in an otherwise good response
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.price_change_rate = price_change_rate
+        self._rng = random.Random(seed)
+        self._prices: Dict[str, float] = {}
+        
+        self.requests = 0
+        self.throttled = 0
+        self.items_returned = 0
+        self.items_failed = 0
+        self.latencies: List[float] = []
+    
+    def _price(self, asin: str) -> float:
+        price = self._prices.get(asin)
+        if price is None:
+            price = round(random.Random(asin).uniform(5, 500), 2)
+        elif self._rng.random() < self.price_change_rate:
+            price = round(max(1.0, price * self._rng.uniform(0.85, 1.1)), 2)
+        self._prices[asin] = price
+        return price
+    
+    def _item(self, asin: str, resources: List[str]) -> Dict:
+        price = self._price(asin)
+        item = {
+            "ASIN": asin,
+            "Offers": {
+                "Listings": [{"Price": {"Amount": price, "Currency": "USD"}, "Availability": {"Message": "In Stock"}}],
+                "Summaries": [{"HighestPrice": {"Amount": round(price * 1.25, 2)}}]
+            }
+        }
+        # Metadata only when the request asked for it, like the real API
+        if "ItemInfo.Title" in resources:
+            item["ItemInfo"] = {
+                "Title": {"DisplayValue": f"Synthetic product {asin}"},
+                "ByLineInfo": {"Brand": {"DisplayValue": "Bench"}},
+                "Classifications": {"ProductGroup": {"DisplayValue": "Electronics"}}
+            }
+            item["Images"] = {"Primary": {"Large": {"URL": f"https://example.com/{asin}.jpg"}}}
+        return item
+    
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        self.requests += 1
+        payload = json.loads(request.content)
+        asins = payload.get("ItemIds", [])
+        resources = payload.get("Resources", [])
+        
+        delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        
+        if self._rng.random() < self.throttle_rate:
+            self.throttled += 1
+            self.latencies.append(time.perf_counter() - start)
+            return httpx.Response(429, json={"Errors": [{"Code": "TooManyRequests", "Message": "The request was denied due to request throttling."}]})
+        
+        items, errors = [], []
+        for asin in asins:
+            if self._rng.random() < self.error_rate:
+                errors.append({"Code": "InvalidParameterValue", "Message": f"The ItemId {asin} provided in the request is invalid."})
+            else:
+                items.append(self._item(asin, resources))
+        self.items_returned += len(items)
+        self.items_failed += len(errors)
+        
+        body = {"ItemsResult": {"Items": items}}
+        if errors:
+            body["Errors"] = errors
+        self.latencies.append(time.perf_counter() - start)
+        return httpx.Response(200, json=body)
+    
+    def install(self, api, client: Optional[httpx.AsyncClient] = None):
+        """Point an AmazonAPI's shared client at this fake"""
+        api._client = client or httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+    
+    def get_stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "items_returned": self.items_returned,
+            "items_failed": self.items_failed
+        }
@@ -0,0 +1,205 @@
+"""Reproducible benchmarks against a synthetic catalog and a fake PA-API
+
+    python -m benchmarks.run --products 2000 --observations 100 --out results.json
+    python -m benchmarks.run --scenarios refresh,load --throttle-rate 0.05 --error-rate 0.01
+    python -m benchmarks.compare baseline.json results.json
+
+Each run builds a fresh SQLite database (or uses --database-url, which must
+point at an empty database), fills it with products x observations, and runs
+the selected scenarios in-process. Results are written as JSON with
+throughput and p50/p90/p99 latency per scenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ["refresh", "product_detail", "history_raw", "history_auto", "trending", "load"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the refresh pipeline and read endpoints")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--observations", type=int, default=100, help="Stored price rows per product")
+    parser.add_argument("--days", type=int, default=90, help="History span the observations are spread over")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per read scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients in the load scenario")
+    parser.add_argument("--latency-ms", type=float, default=80, help="Fake PA-API response time")
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of PA-API requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of ASINs returned as item errors")
+    parser.add_argument("--tps", type=float, default=50, help="AMAZON_TPS for the rate limiter")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="Empty database to use instead of a temporary SQLite file")
+    parser.add_argument("--out", default="benchmark-results.json")
+    args = parser.parse_args(argv)
+    
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+def configure_environment(args, workdir: str):
+    """Settings the app reads at import time, so this runs before any app module is imported"""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+    os.environ["AMAZON_TPS"] = str(args.tps)
+    os.environ["AMAZON_TPD"] = "100000000"
+    os.environ["PRICE_ARCHIVE_DIR"] = f"{workdir}/archive"
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    os.environ["WORKERS_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    for name in ("AMAZON_ACCESS_KEY", "AMAZON_SECRET_KEY", "AMAZON_PARTNER_TAG", "AMAZON_ASSOCIATE_TAG"):
+        os.environ.setdefault(name, "bench")
+
+def migrate():
+    from alembic import command
+    from alembic.config import Config
+    
+    # No ini file, so alembic leaves the app's logging configuration alone
+    config = Config()
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(config, "head")
+
+def summarize(latencies: List[float], elapsed: float, operations: int, unit: str) -> Dict:
+    samples = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "operations": operations,
+        "unit": unit,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(operations / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p90_ms": round(float(np.percentile(samples, 90)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3)
+    }
+
+async def timed_requests(client, make_path: Callable[[random.Random], str], count: int, concurrency: int, seed: int) -> Dict:
+    """Issue count GETs from concurrency clients and time each one"""
+    rng = random.Random(seed)
+    paths = [make_path(rng) for _ in range(count)]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+    
+    async def client_loop():
+        nonlocal next_index
+        while next_index < len(paths):
+            path = paths[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - start, count, "requests")
+    result["concurrency"] = concurrency
+    result["status_codes"] = statuses
+    return result
+
+async def run_scenarios(args) -> Tuple[Dict, Dict]:
+    import httpx
+    from benchmarks.datagen import generate
+    from benchmarks.fake_paapi import FakePaapi
+    from app.database import dispose_engines
+    from app.main import app
+    from app.services.amazon_api import amazon_api
+    from app.services.price_tracker import price_tracker
+    
+    fake = FakePaapi(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    fake.install(amazon_api)
+    
+    start = time.perf_counter()
+    asins = await generate(args.products, args.observations, args.days, args.seed)
+    datagen = {"seconds": round(time.perf_counter() - start, 3), "price_rows": args.products * args.observations}
+    results = {}
+    
+    product_path = lambda rng: f"/api/products/{rng.choice(asins)}"
+    history_raw_path = lambda rng: f"/api/products/{rng.choice(asins)}/history?days=30"
+    history_auto_path = lambda rng: f"/api/products/{rng.choice(asins)}/history?days={args.days}&resolution=auto&max_points=200"
+    trending_path = lambda rng: f"/api/trending?limit={rng.choice([10, 20, 50])}"
+    mixed = [product_path, product_path, history_raw_path, history_auto_path, trending_path]
+    
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for name in args.scenarios:
+                print(f"Running {name}...", file=sys.stderr)
+                if name == "refresh":
+                    fake.latencies.clear()
+                    start = time.perf_counter()
+                    refreshed = await price_tracker.track_product_prices(asins)
+                    result = summarize(fake.latencies, time.perf_counter() - start, len(asins), "asins")
+                    result["latency_of"] = "PA-API requests"
+                    result["saved"] = sum(refreshed.values())
+                    result["pipeline"] = price_tracker.last_run_stats
+                    result["fake_paapi"] = fake.get_stats()
+                elif name == "product_detail":
+                    result = await timed_requests(client, product_path, args.requests, 1, args.seed)
+                elif name == "history_raw":
+                    result = await timed_requests(client, history_raw_path, args.requests, 1, args.seed)
+                elif name == "history_auto":
+                    result = await timed_requests(client, history_auto_path, args.requests, 1, args.seed)
+                elif name == "trending":
+                    result = await timed_requests(client, trending_path, args.requests, 1, args.seed)
+                else:
+                    result = await timed_requests(client, lambda rng: rng.choice(mixed)(rng), args.requests * 4, args.concurrency, args.seed)
+                results[name] = result
+    
+    await dispose_engines()
+    return datagen, results
+
+def git_revision() -> Dict:
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="zobda-bench-") as workdir:
+        configure_environment(args, workdir)
+        migrate()
+        datagen, scenarios = asyncio.run(run_scenarios(args))
+    
+    report = {
+        "format": 1,
+        "created_at": datetime.utcnow().isoformat(),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": "sqlite (temporary)" if not args.database_url else args.database_url.split(":", 1)[0],
+        "params": {key: value for key, value in vars(args).items() if key not in ("out", "database_url")},
+        "datagen": datagen,
+        "scenarios": scenarios
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    
+    for name, result in scenarios.items():
+        print(f"{name:16} {result['throughput_per_second']:>10.1f} {result['unit']}/s  p50 {result['p50_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms")
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+# The app reads its settings at import time, so point it at a scratch database before any test imports it
+_workdir = tempfile.mkdtemp(prefix="zobda-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ["PRICE_ARCHIVE_DIR"] = f"{_workdir}/archive"
+os.environ["SCHEDULER_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest
+from app.database import engine
+from app.models.price_data import Base
+
+@pytest.fixture(autouse=True)
+def database():
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import select
+from app.database import SessionLocal, dispose_engines
+from app.models.price_data import AlertOutbox, UserWatchlist
+from app.services.alert_engine import AlertEngine
+
+ASIN = "B000ALERT1"
+
+def add_alert(alert_price, user_id="user-1"):
+    with SessionLocal() as session:
+        watchlist = UserWatchlist(user_id=user_id, asin=ASIN, alert_price=alert_price)
+        session.add(watchlist)
+        session.commit()
+        return watchlist.id
+
+def observation(price):
+    return {"asin": ASIN, "current_price": price, "tracked_at": datetime.utcnow()}
+
+def run(*engines_and_prices):
+    """Feed each (engine, price) pair through process() in order; returns how many fired each time"""
+    async def feed():
+        try:
+            return [await engine.process([observation(price)]) for engine, price in engines_and_prices]
+        finally:
+            await dispose_engines()
+    return asyncio.run(feed())
+
+def outbox_rows():
+    with SessionLocal() as session:
+        return list(session.scalars(select(AlertOutbox)))
+
+def triggered_at(watchlist_id):
+    with SessionLocal() as session:
+        return session.get(UserWatchlist, watchlist_id).alert_triggered_at
+
+def test_fires_once_per_crossing_and_rearms_above_hysteresis():
+    watchlist_id = add_alert(100.0)
+    engine = AlertEngine(rearm_percent=2, reload_seconds=0)
+    
+    # Above the threshold, at it, still below it, back inside the hysteresis band, then clear of it
+    assert run((engine, 105.0), (engine, 100.0), (engine, 95.0), (engine, 101.5)) == [0, 1, 0, 0]
+    assert triggered_at(watchlist_id) is not None
+    
+    assert run((engine, 102.5)) == [0]
+    assert triggered_at(watchlist_id) is None
+    
+    assert run((engine, 99.0)) == [1]
+    rows = outbox_rows()
+    assert [(row.watchlist_id, row.triggered_price) for row in rows] == [(watchlist_id, 100.0), (watchlist_id, 99.0)]
+
+def test_engines_in_separate_processes_write_one_outbox_row():
+    watchlist_id = add_alert(50.0)
+    first, second = AlertEngine(reload_seconds=0), AlertEngine(reload_seconds=0)
+    
+    # Both load the armed alert before either sees the crossing
+    run((first, 60.0), (second, 60.0))
+    run((first, 45.0), (second, 44.0))
+    
+    rows = outbox_rows()
+    assert len(rows) == 1
+    assert rows[0].watchlist_id == watchlist_id and rows[0].triggered_price == 45.0
+
+def test_reload_picks_up_rows_changed_elsewhere():
+    kept_id = add_alert(20.0)
+    engine = AlertEngine(reload_seconds=0)
+    run((engine, 30.0))
+    
+    # Written by another process: a new alert and a cleared one
+    added_id = add_alert(25.0, user_id="user-2")
+    with SessionLocal() as session:
+        session.get(UserWatchlist, kept_id).alert_price = None
+        session.commit()
+    
+    async def reload():
+        try:
+            await engine.reload()
+        finally:
+            await dispose_engines()
+    asyncio.run(reload())
+    assert set(engine._alerts) == {added_id}
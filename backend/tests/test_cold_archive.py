@@ -0,0 +1,44 @@
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from app.services.cold_archive import SEGMENT_DTYPE, ColdArchive
+
+ASIN = "B000ARCHV1"
+
+def row(tracked_at, price):
+    return {"tracked_at": tracked_at, "current_price": price, "original_price": price, "currency": "USD", "availability": "In Stock"}
+
+def test_observations_in_the_same_second_survive_separate_runs(tmp_path):
+    archive = ColdArchive(root=str(tmp_path))
+    second = datetime(2026, 1, 5, 12, 0, 0)
+    
+    assert archive.write_segment(ASIN, [row(second + timedelta(microseconds=100), 10.0)]) == 1
+    # The next run sees the archived row again after a crash, plus a later one in the same second
+    later = [row(second + timedelta(microseconds=100), 10.0), row(second + timedelta(microseconds=900), 11.0)]
+    assert archive.write_segment(ASIN, later) == 1
+    
+    rows = archive.read(ASIN)
+    assert [(r["tracked_at"], r["current_price"]) for r in rows] == [
+        (second + timedelta(microseconds=100), 10.0),
+        (second + timedelta(microseconds=900), 11.0)
+    ]
+    assert archive.read(ASIN, start=second + timedelta(microseconds=500)) == rows[1:]
+
+def test_reads_segments_stored_in_whole_seconds(tmp_path):
+    archive = ColdArchive(root=str(tmp_path))
+    archive.write_segment(ASIN, [row(datetime(2026, 1, 1), 5.0)])
+    
+    # A segment written before timestamps kept their microseconds
+    records = np.zeros(2, dtype=SEGMENT_DTYPE)
+    first = int((datetime(2025, 12, 1) - datetime(1970, 1, 1)).total_seconds())
+    records["tracked_at"] = [first, first + 60]
+    records["current_price"] = [3.0, 4.0]
+    np.save(os.path.join(tmp_path, ASIN, f"{first}-{first + 60}.npy"), records)
+    
+    rows = archive.read(ASIN)
+    assert [(r["tracked_at"], r["current_price"]) for r in rows] == [
+        (datetime(2025, 12, 1), 3.0),
+        (datetime(2025, 12, 1, 0, 1), 4.0),
+        (datetime(2026, 1, 1), 5.0)
+    ]
+    assert [r["current_price"] for r in archive.read(ASIN, start=datetime(2025, 12, 1, 0, 0, 0, 1), end=datetime(2026, 1, 1))] == [4.0]
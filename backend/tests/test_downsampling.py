@@ -0,0 +1,21 @@
+import random
+import pytest
+from app.services.downsampling import MIN_LTTB_POINTS, lttb
+
+def series(n, seed=0):
+    rng = random.Random(seed)
+    return [(i, rng.uniform(10, 100)) for i in range(n)]
+
+@pytest.mark.parametrize("threshold", [MIN_LTTB_POINTS, 6, 10, 200])
+def test_never_exceeds_threshold(threshold):
+    for seed in range(50):
+        points = series(1000, seed)
+        sampled = lttb(points, threshold, x=lambda p: p[0], y=lambda p: p[1])
+        assert len(sampled) <= threshold
+        assert sampled[0] == points[0] and sampled[-1] == points[-1]
+        assert min(points, key=lambda p: p[1]) in sampled
+        assert max(points, key=lambda p: p[1]) in sampled
+
+def test_rejects_thresholds_too_small_for_the_extremes():
+    with pytest.raises(ValueError):
+        lttb(series(100), MIN_LTTB_POINTS - 1, x=lambda p: p[0], y=lambda p: p[1])
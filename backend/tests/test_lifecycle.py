@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+from app.services.lifecycle import ServiceContainer
+from app.services.refresh_workers import RefreshWorkers, refresh_workers
+from app.services.trending import trending_engine
+
+def test_workers_without_shared_redis_fail_startup_not_import(monkeypatch):
+    monkeypatch.setenv("WORKERS_ENABLED", "true")
+    monkeypatch.delenv("REFRESH_JOBS_REDIS_URL", raising=False)
+    monkeypatch.delenv("AMAZON_RATE_LIMIT_REDIS_URL", raising=False)
+    # Constructing only reads settings
+    workers = RefreshWorkers()
+    monkeypatch.setattr(refresh_workers, "enabled", workers.enabled)
+    
+    container = ServiceContainer(warm_up=False)
+    with pytest.raises(ValueError, match="REFRESH_JOBS_REDIS_URL"):
+        asyncio.run(container.startup())
+    assert not container.started
+
+def test_invalid_trending_baseline_fails_startup(monkeypatch):
+    monkeypatch.setattr(trending_engine, "baseline", "median")
+    
+    container = ServiceContainer(warm_up=False)
+    with pytest.raises(ValueError, match="TRENDING_BASELINE"):
+        asyncio.run(container.startup())
+    assert not container.started
@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta
+from app.database import SessionLocal, dispose_engines
+from app.models.price_data import PriceData, Product, ProductLatestPrice
+from app.services.price_tracker import price_tracker
+
+ASIN = "B000TEST01"
+
+def add_product(observations, last_seen_at):
+    """A product with the given (tracked_at, price) rows and its latest-price row"""
+    with SessionLocal() as session:
+        product = Product(asin=ASIN, title="Test product", category="Electronics", last_seen_at=last_seen_at)
+        session.add(product)
+        session.flush()
+        for tracked_at, price in observations:
+            session.add(PriceData(
+                product_id=product.id, asin=ASIN, current_price=price, original_price=price,
+                currency="USD", availability="In Stock", tracked_at=tracked_at
+            ))
+        tracked_at, price = observations[-1]
+        session.add(ProductLatestPrice(
+            product_id=product.id, asin=ASIN, current_price=price, original_price=price,
+            currency="USD", availability="In Stock", previous_price=None,
+            tracked_at=tracked_at, last_seen_at=last_seen_at
+        ))
+        session.commit()
+
+def history(days=30):
+    async def fetch():
+        try:
+            return await price_tracker.get_price_history(ASIN, days)
+        finally:
+            await dispose_engines()
+    return asyncio.run(fetch())
+
+def test_stable_price_spans_the_window():
+    now = datetime.utcnow()
+    last_seen_at = now - timedelta(hours=2)
+    add_product([(now - timedelta(days=60), 19.99)], last_seen_at)
+    
+    points = history(30)
+    
+    assert [point["price"] for point in points] == [19.99, 19.99]
+    assert points[0]["date"] == price_tracker.history_start(30).isoformat()
+    assert points[-1]["date"] == last_seen_at.isoformat()
+
+def test_change_inside_the_window_keeps_the_opening_price():
+    now = datetime.utcnow()
+    changed_at = now - timedelta(days=10)
+    last_seen_at = now - timedelta(hours=1)
+    add_product([(now - timedelta(days=60), 25.0), (changed_at, 20.0)], last_seen_at)
+    
+    points = history(30)
+    
+    assert [point["price"] for point in points] == [25.0, 20.0, 20.0]
+    assert points[1]["date"] == changed_at.isoformat()
+    assert points[-1]["date"] == last_seen_at.isoformat()
+
+def test_no_closing_point_when_the_last_poll_is_the_last_row():
+    now = datetime.utcnow()
+    changed_at = now - timedelta(days=5)
+    add_product([(now - timedelta(days=60), 25.0), (changed_at, 20.0)], changed_at)
+    
+    points = history(30)
+    
+    assert [point["price"] for point in points] == [25.0, 20.0]
+
+def test_products_not_polled_in_the_window_stay_empty():
+    now = datetime.utcnow()
+    add_product([(now - timedelta(days=60), 19.99)], now - timedelta(days=45))
+    
+    assert history(30) == []
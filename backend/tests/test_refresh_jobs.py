@@ -0,0 +1,22 @@
+import asyncio
+from app.services.refresh_jobs import RefreshJobs
+
+def test_redelivered_task_is_counted_once():
+    jobs = RefreshJobs(redis_url="")
+    
+    async def run():
+        await jobs.create("job-1", total=4, tasks=2)
+        assert await jobs.record("job-1", "job-1:0", {"A": True, "B": False}, {"Throttled": 1})
+        # acks_late redelivers the same task after a worker crash
+        assert not await jobs.record("job-1", "job-1:0", {"A": True, "B": False}, {"Throttled": 1})
+        running = await jobs.get("job-1")
+        await jobs.record("job-1", "job-1:1", {"C": True, "D": True}, {})
+        return running, await jobs.get("job-1", include_failed_asins=True)
+    
+    running, done = asyncio.run(run())
+    assert running["status"] == "running"
+    assert (running["tasks_done"], running["done"], running["saved"], running["failed"]) == (1, 2, 1, 1)
+    assert done["status"] == "done"
+    assert (done["done"], done["saved"], done["failed"]) == (4, 3, 1)
+    assert done["failures_by_reason"] == {"Throttled": 1}
+    assert done["failed_asins"] == ["B"]
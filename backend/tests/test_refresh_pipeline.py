@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from app.services.refresh_pipeline import RefreshPipeline, TokenBucket
+
+class FakeApi:
+    """Answers GetItems with the queued status codes in turn, then 200"""
+    
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+    
+    async def fetch_items_raw(self, asins, profile="full"):
+        self.requests.append(list(asins))
+        status_code = self.statuses.pop(0) if self.statuses else 200
+        if status_code != 200:
+            return status_code, {"error": "TooManyRequests"}
+        return 200, {"ItemsResult": {"Items": [{"ASIN": asin} for asin in asins]}}
+    
+    def parse_items_response(self, data, batch):
+        return {item["ASIN"]: {"asin": item["ASIN"]} for item in data["ItemsResult"]["Items"]}, {}
+
+async def save_all(batch):
+    return {asin: True for asin, _ in batch}
+
+def run(pipeline, asins):
+    return asyncio.run(asyncio.wait_for(pipeline.run(asins), 10))
+
+def test_throttled_batch_backs_off_and_retries():
+    api = FakeApi([429])
+    limiter = TokenBucket(100, per_day=None)
+    pipeline = RefreshPipeline(api, save_all, limiter=limiter, max_in_flight=1, backoff_base=0.001)
+    
+    results, stats = run(pipeline, ["B000PIPE01", "B000PIPE02"])
+    
+    assert results == {"B000PIPE01": True, "B000PIPE02": True}
+    assert api.requests == [["B000PIPE01", "B000PIPE02"]] * 2
+    assert (stats.requests, stats.throttled, stats.retries, stats.saved) == (2, 1, 1, 2)
+    # Halved on the 429, then one additive step back on the 200
+    assert limiter.rate == pytest.approx(100 / 2 + 100 / 10)
+
+def test_gives_up_after_max_retries():
+    api = FakeApi([503] * 3)
+    pipeline = RefreshPipeline(api, save_all, limiter=TokenBucket(100, per_day=None), max_in_flight=1, max_retries=2, backoff_base=0.001)
+    
+    results, stats = run(pipeline, ["B000PIPE01"])
+    
+    assert results == {"B000PIPE01": False}
+    assert len(api.requests) == 3
+    assert stats.failures_by_reason == {"HTTP 503": 1}
+
+def test_persist_failure_fails_the_batch_without_stalling():
+    async def broken_save(batch):
+        raise RuntimeError("database unavailable")
+    
+    asins = [f"B000PIPE{i:02d}" for i in range(50)]
+    pipeline = RefreshPipeline(FakeApi(), broken_save, limiter=TokenBucket(1000, per_day=None), persist_batch_size=10)
+    
+    results, stats = run(pipeline, asins)
+    
+    assert not any(results.values())
+    assert stats.failures_by_reason == {"SaveError": 50}
+    assert stats.saved == 0
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from datetime import datetime
+import pytest
+from app.database import dispose_engines
+from app.services.refresh_scheduler import DEAD_AFTER_FAILURES, RefreshScheduler
+
+def observation(asin, changed):
+    now = datetime.utcnow()
+    # A poll that changed the price moves tracked_at along with last_seen_at
+    return {"asin": asin, "current_price": 19.99, "previous_price": 21.99, "tracked_at": now, "last_seen_at": now if changed else datetime(2026, 1, 1)}
+
+def run_scheduler(scheduler, check):
+    """Run check against a started scheduler whose refreshes all succeed"""
+    async def refresh(asins):
+        return {asin: True for asin in asins}
+    
+    async def run():
+        scheduler.enabled = True
+        scheduler.start(refresh)
+        try:
+            await scheduler.ensure_fresh()
+            check(scheduler)
+        finally:
+            await scheduler.stop()
+            await dispose_engines()
+    asyncio.run(run())
+
+def test_interval_grows_as_prices_settle_and_listings_fail():
+    def check(scheduler):
+        for _ in range(5):
+            scheduler.observe([observation("B000VOLAT1", changed=True)])
+        volatile = scheduler._entries["B000VOLAT1"].interval
+        
+        intervals = []
+        for _ in range(10):
+            scheduler.observe([observation("B000VOLAT1", changed=False)])
+            intervals.append(scheduler._entries["B000VOLAT1"].interval)
+        assert volatile < intervals[0]
+        assert intervals == sorted(intervals) and intervals[-1] < scheduler.max_interval
+        
+        for _ in range(DEAD_AFTER_FAILURES):
+            scheduler._complete("B000VOLAT1", False)
+        assert scheduler._entries["B000VOLAT1"].interval == scheduler.max_interval
+    
+    run_scheduler(RefreshScheduler(min_interval=300, max_interval=86400, daily_budget=1000), check)
+
+def test_intervals_stretch_to_fit_the_daily_budget():
+    def check(scheduler):
+        asins = [f"B000BUD{i:03d}" for i in range(50)]
+        scheduler.observe([observation(asin, changed=False) for asin in asins])
+        # Fifty ASINs at one poll a day want five batched requests a day; the budget allows one
+        assert scheduler.budget_scale == pytest.approx(5.0)
+        entry = scheduler._entries[asins[-1]]
+        assert entry.next_due - time.monotonic() == pytest.approx(86400 * 5, abs=60)
+        
+        # With room in the budget, the next reschedule is back at the unscaled interval
+        scheduler.daily_budget = 5
+        assert scheduler.budget_scale == pytest.approx(1.0)
+        scheduler.observe([observation(asins[-1], changed=False)])
+        assert entry.next_due - time.monotonic() == pytest.approx(86400, abs=60)
+    
+    run_scheduler(RefreshScheduler(min_interval=300, max_interval=86400, daily_budget=1), check)
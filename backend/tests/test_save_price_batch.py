@@ -0,0 +1,24 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import select
+from app.database import SessionLocal, dispose_engines
+from app.models.price_data import PriceData, Product
+from app.services.price_tracker import price_tracker
+
+def price(current_price):
+    return {"current_price": current_price, "original_price": current_price, "currency": "USD", "availability": "In Stock"}
+
+def test_price_poll_for_unknown_product_skips_only_that_asin():
+    with SessionLocal() as session:
+        session.add(Product(asin="B000KNOWN1", title="Known", category="Electronics", last_seen_at=datetime.utcnow()))
+        session.commit()
+    
+    async def save():
+        try:
+            return await price_tracker.save_price_batch([("B000KNOWN1", price(9.99)), ("B000NOROW1", price(4.99))])
+        finally:
+            await dispose_engines()
+    
+    assert asyncio.run(save()) == {"B000KNOWN1": True, "B000NOROW1": False}
+    with SessionLocal() as session:
+        assert [(row.asin, row.current_price) for row in session.scalars(select(PriceData))] == [("B000KNOWN1", 9.99)]